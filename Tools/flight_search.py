@@ -1,13 +1,19 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, ClassVar
 from langchain.tools import BaseTool
+import asyncio
 import logging
-from pydantic import BaseModel, Field
+import operator
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import replace
+from cachetools import TTLCache
+from pydantic import BaseModel, Field, ValidationError, ValidationInfo, field_validator, model_validator
 from langchain_core.tools.base import ArgsSchema
-from datetime import datetime, timedelta
-import json
+from datetime import date
+import orjson
 
-# Set up logging for debugging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 try:
@@ -16,6 +22,106 @@ except ImportError:
     logger.error("fast-flights package not installed. Please install with: pip install fast-flights")
     raise ImportError("fast-flights package is required but not installed")
 
+# Precompiled format checks; date.fromisoformat is C-implemented and much cheaper than strptime
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_IATA_RE = re.compile(r"[A-Z]{3}")
+
+# Flight fields are read in one attrgetter call rather than one getattr per field
+_FLIGHT_KEYS = ("airline", "departure_time", "arrival_time", "duration", "stops", "price", "is_best", "delay", "time_ahead")
+_FLIGHT_ATTR_NAMES = ("name", "departure", "arrival", "duration", "stops", "price", "is_best", "delay", "arrival_time_ahead")
+_FLIGHT_DEFAULTS = ("Unknown", "N/A", "N/A", "N/A", "N/A", "N/A", False, None, None)
+_FLIGHT_ATTRS = operator.attrgetter(*_FLIGHT_ATTR_NAMES)
+_PRICE_RE = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+
+def _price_key(flight) -> float:
+    """Numeric price of a flight for sorting; unparseable prices sort last."""
+    match = _PRICE_RE.search(str(getattr(flight, 'price', None) or ""))
+    return float(match.group().replace(",", "")) if match else float("inf")
+
+
+def _flight_sort_key(flight):
+    """Best deals first, then cheapest."""
+    return (not getattr(flight, 'is_best', False), _price_key(flight))
+
+
+# fast-flights' "common" mode is a single direct request; "fallback" adds a slower
+# but more reliable retry through a scraping service. Try the cheap path first.
+_FAST_FETCH_TIMEOUT = 3.0
+# Routes whose fast fetch failed this often in the last hour go straight to fallback
+_FAST_FETCH_MAX_FAILURES = 2
+_route_failures: TTLCache = TTLCache(maxsize=1024, ttl=3600)
+_route_failures_lock = threading.Lock()
+
+
+def _submit_fast_fetch(**kwargs) -> Future:
+    """Run a fast get_flights call on its own daemon thread.
+
+    A fetch that outlives its timeout can't be cancelled. On a dedicated thread it only
+    finishes in the background, instead of holding a shared pool worker that concurrent
+    searches would queue behind.
+    """
+    future: Future = Future()
+
+    def run():
+        try:
+            future.set_result(get_flights(**kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="flights-fast", daemon=True).start()
+    return future
+
+
+def _fetch_flights(flight_data: List[FlightData], trip: str, seat: str, passengers: Passengers) -> Result:
+    """Call get_flights in fast mode first, falling back to the reliable mode if it errors or times out."""
+    route = tuple((leg.from_airport, leg.to_airport) for leg in flight_data)
+    with _route_failures_lock:
+        failures = _route_failures.get(route, 0)
+
+    if failures < _FAST_FETCH_MAX_FAILURES:
+        future = _submit_fast_fetch(
+            flight_data=flight_data, trip=trip, seat=seat,
+            passengers=passengers, fetch_mode="common"
+        )
+        try:
+            result = future.result(timeout=_FAST_FETCH_TIMEOUT)
+            # An empty result is an answer (no flights on this route), not a failure,
+            # so it is returned rather than repeated in fallback mode
+            with _route_failures_lock:
+                _route_failures.pop(route, None)
+            return result
+        except FutureTimeoutError:
+            logger.debug("Fast flight fetch timed out for %s", route)
+        except Exception as e:
+            logger.debug("Fast flight fetch failed for %s: %s", route, e)
+        with _route_failures_lock:
+            _route_failures[route] = failures + 1
+
+    return get_flights(
+        flight_data=flight_data, trip=trip, seat=seat,
+        passengers=passengers, fetch_mode="fallback"
+    )
+
+
+def _parse_future_date(date_str: str) -> Optional[date]:
+    """Parse a YYYY-MM-DD date, returning None if malformed or in the past."""
+    if not _DATE_RE.fullmatch(date_str):
+        return None
+    try:
+        date_obj = date.fromisoformat(date_str)
+    except ValueError:
+        return None
+    # Check if date is not in the past (allow today)
+    if date_obj < date.today():
+        return None
+    return date_obj
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    """Turn input validation failures into the plain messages returned to the LLM."""
+    return " ".join(err["msg"].removeprefix("Value error, ") for err in error.errors())
+
 
 class FlightSearchInput(BaseModel):
     from_airport: str = Field(..., description="IATA code of departure airport (e.g., 'TPE', 'JFK', 'LAX')")
@@ -29,6 +135,52 @@ class FlightSearchInput(BaseModel):
     infants_in_seat: int = Field(default=0, description="Number of infants with their own seat (0-5)")
     infants_on_lap: int = Field(default=0, description="Number of infants on lap (0-5)")
 
+    @field_validator("from_airport", "to_airport", mode="before")
+    @classmethod
+    def _check_airport_code(cls, value: Any, info: ValidationInfo) -> str:
+        code = str(value).strip().upper()
+        if not _IATA_RE.fullmatch(code):
+            label = "departure" if info.field_name == "from_airport" else "destination"
+            raise ValueError(f"Invalid {label} airport code: {code}. Please use 3-letter IATA codes (e.g., 'JFK', 'LAX').")
+        return code
+
+    @field_validator("departure_date", "return_date")
+    @classmethod
+    def _check_date(cls, value: Optional[str], info: ValidationInfo) -> Optional[str]:
+        if value is not None and _parse_future_date(value) is None:
+            label = "departure" if info.field_name == "departure_date" else "return"
+            raise ValueError(f"Invalid {label} date: {value}. Please use YYYY-MM-DD format and ensure the date is not in the past.")
+        return value
+
+    @field_validator("trip_type", "seat_class", mode="before")
+    @classmethod
+    def _lowercase(cls, value: Any) -> Any:
+        return value.lower() if isinstance(value, str) else value
+
+    @field_validator("adults")
+    @classmethod
+    def _check_adults(cls, value: int) -> int:
+        if value < 1 or value > 9:
+            raise ValueError("Number of adults must be between 1 and 9.")
+        return value
+
+    @field_validator("children")
+    @classmethod
+    def _check_children(cls, value: int) -> int:
+        if value < 0 or value > 8:
+            raise ValueError("Number of children must be between 0 and 8.")
+        return value
+
+    @model_validator(mode="after")
+    def _check_return_date(self) -> "FlightSearchInput":
+        if self.trip_type == "round-trip":
+            if not self.return_date:
+                raise ValueError("Return date is required for round-trip flights.")
+            # ISO dates compare correctly as strings
+            if self.return_date <= self.departure_date:
+                raise ValueError("Return date must be after departure date.")
+        return self
+
 
 class FlightSearchTool(BaseTool):
     name: str = "FlightSearch"
@@ -36,54 +188,72 @@ class FlightSearchTool(BaseTool):
         "Search for flights using Google Flights data. "
         "Input should include departure and destination airport codes (IATA format), "
         "departure date, and optionally return date for round-trip flights. "
-        "This tool returns real flight information including prices, airlines, duration, and stops. "
-        "Use this to find actual flight options for budget planning."
+        'Returns compact JSON: {"f":from,"t":to,"d":departure date,"r":return date,'
+        '"cls":seat class,"pax":[adults,children,infants in seat,infants on lap],"trend":price trend,'
+        '"p":[{"al":airline,"dep":departure,"arr":arrival,"dur":duration,"s":stops,'
+        '"$":price,"best":1 if best deal,"dly":delay}]}. Flights are best deals first, then cheapest; '
+        "unknown fields are omitted. Use this to find actual flight options for budget planning."
     )
     args_schema: Optional[ArgsSchema] = FlightSearchInput
     return_direct: bool = False
+    # Inputs are validated once by FlightSearchInput; failures go back to the LLM as text
+    handle_validation_error: Any = _format_validation_error
+    # Fetch round-trip legs as two concurrent one-way searches. Off by default because
+    # airlines often price a round-trip below the sum of its one-way fares.
+    split_round_trip: bool = False
 
-    def __init__(self):
-        super().__init__()
-        logger.info("FlightSearchTool initialized successfully")
-
-    def _validate_date(self, date_str: str) -> bool:
-        """Validate date format and ensure it's not in the past."""
-        try:
-            date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-            # Check if date is not in the past (allow today)
-            if date_obj.date() < datetime.now().date():
-                return False
-            return True
-        except ValueError:
-            return False
-
-    def _validate_airport_code(self, code: str) -> bool:
-        """Basic validation for IATA airport codes."""
-        return len(code) == 3 and code.isalpha() and code.isupper()
+    # Shared across instances: identical searches within 10 minutes skip the Google Flights scrape
+    _cache: ClassVar[TTLCache] = TTLCache(maxsize=512, ttl=600)
+    _cache_lock: ClassVar[threading.RLock] = threading.RLock()
 
     def _format_flight_info(self, flight) -> Dict[str, Any]:
         """Format flight information for better readability."""
         try:
-            return {
-                "airline": getattr(flight, 'name', 'Unknown'),
-                "departure_time": getattr(flight, 'departure', 'N/A'),
-                "arrival_time": getattr(flight, 'arrival', 'N/A'),
-                "duration": getattr(flight, 'duration', 'N/A'),
-                "stops": getattr(flight, 'stops', 'N/A'),
-                "price": getattr(flight, 'price', 'N/A'),
-                "is_best": getattr(flight, 'is_best', False),
-                "delay": getattr(flight, 'delay', None),
-                "time_ahead": getattr(flight, 'arrival_time_ahead', None)
-            }
+            try:
+                return dict(zip(_FLIGHT_KEYS, _FLIGHT_ATTRS(flight)))
+            except AttributeError:
+                # Fall back to per-attribute defaults when the result omits a field
+                return {
+                    key: getattr(flight, attr, default)
+                    for key, attr, default in zip(_FLIGHT_KEYS, _FLIGHT_ATTR_NAMES, _FLIGHT_DEFAULTS)
+                }
         except Exception as e:
-            logger.error(f"Error formatting flight info: {str(e)}")
+            logger.error("Error formatting flight info: %s", e)
             return {"error": "Could not format flight information"}
 
+    def _compact_flight(self, flight) -> Dict[str, Any]:
+        """Short-key dict for one flight, omitting unknown fields; empty if it can't be read."""
+        flight_info = self._format_flight_info(flight)
+        if "error" in flight_info:
+            return {}
+        entry = {"al": flight_info['airline']}
+        for key, field in (("dep", "departure_time"), ("arr", "arrival_time"), ("dur", "duration"),
+                           ("s", "stops"), ("$", "price")):
+            if flight_info[field] != 'N/A':
+                entry[key] = flight_info[field]
+        if flight_info.get('is_best'):
+            entry["best"] = 1
+        if flight_info['delay']:
+            entry["dly"] = flight_info['delay']
+        return entry
+
     def _search_flights(self, from_airport: str, to_airport: str, departure_date: str, 
                        return_date: Optional[str] = None, trip_type: str = "one-way",
                        seat_class: str = "economy", adults: int = 1, children: int = 0,
                        infants_in_seat: int = 0, infants_on_lap: int = 0) -> Result:
         """Search for flights using the fast-flights library."""
+        is_round_trip = trip_type == "round-trip" and bool(return_date)
+        cache_key = (
+            from_airport.upper(), to_airport.upper(), departure_date, return_date or "",
+            trip_type, seat_class, adults, children, infants_in_seat, infants_on_lap,
+            self.split_round_trip
+        )
+        with self._cache_lock:
+            cached = self._cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Cache hit for flights: %s → %s on %s", from_airport, to_airport, departure_date)
+            return cached
+
         try:
             # Prepare flight data
             flight_data = [
@@ -91,7 +261,7 @@ class FlightSearchTool(BaseTool):
             ]
             
             # Add return flight data for round-trip
-            if trip_type == "round-trip" and return_date:
+            if is_round_trip:
                 flight_data.append(
                     FlightData(date=return_date, from_airport=to_airport, to_airport=from_airport)
                 )
@@ -104,60 +274,69 @@ class FlightSearchTool(BaseTool):
                 infants_on_lap=infants_on_lap
             )
 
-            logger.info(f"Searching flights: {from_airport} → {to_airport} on {departure_date}")
-            if trip_type == "round-trip" and return_date:
-                logger.info(f"Return flight: {to_airport} → {from_airport} on {return_date}")
-
-            # Perform the search with fallback mode for better reliability
-            result = get_flights(
-                flight_data=flight_data,
-                trip=trip_type,
-                seat=seat_class,
-                passengers=passengers,
-                fetch_mode="fallback"  # Use fallback mode for better reliability
-            )
+            logger.debug("Searching flights: %s → %s on %s", from_airport, to_airport, departure_date)
+            if is_round_trip:
+                logger.debug("Return flight: %s → %s on %s", to_airport, from_airport, return_date)
+
+            if is_round_trip and self.split_round_trip:
+                result = self._search_legs_concurrently(flight_data, seat_class, passengers)
+            else:
+                result = _fetch_flights(flight_data, trip_type, seat_class, passengers)
+
+            # Only cache successful searches so transient failures are retried
+            if getattr(result, 'flights', None):
+                with self._cache_lock:
+                    self._cache[cache_key] = result
 
             return result
 
         except Exception as e:
-            logger.error(f"Error searching flights: {str(e)}")
+            logger.error("Error searching flights: %s", e)
             raise
 
+    def _search_legs_concurrently(self, flight_data: List[FlightData], seat_class: str,
+                                  passengers: Passengers) -> Result:
+        """Fetch the outbound and return legs as parallel one-way searches and merge them."""
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [
+                executor.submit(_fetch_flights, [leg], "one-way", seat_class, passengers)
+                for leg in flight_data
+            ]
+            outbound, inbound = (future.result() for future in futures)
+
+        # Label each leg so one-way prices are not mistaken for round-trip fares
+        flights = (
+            [replace(flight, name=f"Outbound: {flight.name}") for flight in outbound.flights[:5]] +
+            [replace(flight, name=f"Return: {flight.name}") for flight in inbound.flights[:5]]
+        )
+        return Result(current_price=outbound.current_price, flights=flights)
+
+    def _log_search_done(self, from_airport: str, to_airport: str, departure_date: str,
+                         n_results: int, started: float):
+        """Emit a single structured record summarizing a completed search."""
+        duration_ms = (time.perf_counter() - started) * 1000
+        logger.info(
+            "Flight search completed: %s-%s on %s, %d results in %.0f ms",
+            from_airport, to_airport, departure_date, n_results, duration_ms,
+            extra={
+                "route": f"{from_airport}-{to_airport}",
+                "dep": departure_date,
+                "n_results": n_results,
+                "duration_ms": duration_ms
+            }
+        )
+
     def _run(self, from_airport: str, to_airport: str, departure_date: str,
              return_date: Optional[str] = None, trip_type: str = "one-way",
              seat_class: str = "economy", adults: int = 1, children: int = 0,
              infants_in_seat: int = 0, infants_on_lap: int = 0) -> str:
-        """Return a string summary of the flight search results for the LLM."""
+        """Return the flight search results as compact JSON for the LLM."""
         try:
-            # Input validation
-            if not self._validate_airport_code(from_airport):
-                return f"Invalid departure airport code: {from_airport}. Please use 3-letter IATA codes (e.g., 'JFK', 'LAX')."
-            
-            if not self._validate_airport_code(to_airport):
-                return f"Invalid destination airport code: {to_airport}. Please use 3-letter IATA codes (e.g., 'JFK', 'LAX')."
-            
-            if not self._validate_date(departure_date):
-                return f"Invalid departure date: {departure_date}. Please use YYYY-MM-DD format and ensure the date is not in the past."
-            
-            if trip_type == "round-trip":
-                if not return_date:
-                    return "Return date is required for round-trip flights."
-                if not self._validate_date(return_date):
-                    return f"Invalid return date: {return_date}. Please use YYYY-MM-DD format and ensure the date is not in the past."
-                
-                # Check if return date is after departure date
-                dep_date = datetime.strptime(departure_date, "%Y-%m-%d")
-                ret_date = datetime.strptime(return_date, "%Y-%m-%d")
-                if ret_date <= dep_date:
-                    return "Return date must be after departure date."
-
-            if adults < 1 or adults > 9:
-                return "Number of adults must be between 1 and 9."
-            
-            if children < 0 or children > 8:
-                return "Number of children must be between 0 and 8."
+            # Inputs arrive validated and normalized by FlightSearchInput
+            is_round_trip = trip_type == "round-trip"
 
-            logger.info(f"Running flight search: {from_airport} → {to_airport} on {departure_date}")
+            logger.debug("Running flight search: %s → %s on %s", from_airport, to_airport, departure_date)
+            started = time.perf_counter()
             
             # Perform the search
             result = self._search_flights(
@@ -173,84 +352,24 @@ class FlightSearchTool(BaseTool):
                 infants_on_lap=infants_on_lap
             )
 
-            # Format the results
-            output = []
-            
-            # Add search summary
-            passenger_summary = f"{adults} adult(s)"
-            if children > 0:
-                passenger_summary += f", {children} child(ren)"
-            if infants_in_seat > 0:
-                passenger_summary += f", {infants_in_seat} infant(s) with seat"
-            if infants_on_lap > 0:
-                passenger_summary += f", {infants_on_lap} infant(s) on lap"
-
-            trip_summary = f"{trip_type} trip from {from_airport} to {to_airport}"
-            if trip_type == "round-trip" and return_date:
-                trip_summary += f" (return {return_date})"
-            
-            output.append(f"Flight Search Results for {trip_summary}")
-            output.append(f"Passengers: {passenger_summary}")
-            output.append(f"Seat Class: {seat_class.title()}")
-            output.append(f"Departure Date: {departure_date}")
-            
-            # Add price trend information if available
-            if hasattr(result, 'current_price') and result.current_price:
-                output.append(f"Current Price Trend: {result.current_price}")
-            
-            output.append("")  # Empty line for formatting
-
-            # Check if flights were found
-            if not hasattr(result, 'flights') or not result.flights:
-                output.append("No flights found for the specified criteria.")
-                output.append("Suggestions:")
-                output.append("- Try different dates")
-                output.append("- Check if airport codes are correct")
-                output.append("- Consider nearby airports")
-                return "\n".join(output)
-
-            # Display flight results
-            flights = result.flights[:10]  # Limit to top 10 results
-            output.append(f"Found {len(flights)} flight options:\n")
-
-            for idx, flight in enumerate(flights, 1):
-                flight_info = self._format_flight_info(flight)
-                
-                if "error" in flight_info:
-                    continue
-                
-                # Mark best flights
-                best_indicator = " ⭐ BEST DEAL" if flight_info.get('is_best', False) else ""
-                
-                flight_line = f"{idx}. {flight_info['airline']}{best_indicator}"
-                output.append(flight_line)
-                
-                # Add flight details
-                if flight_info['departure_time'] != 'N/A':
-                    output.append(f"   Departure: {flight_info['departure_time']}")
-                if flight_info['arrival_time'] != 'N/A':
-                    output.append(f"   Arrival: {flight_info['arrival_time']}")
-                if flight_info['duration'] != 'N/A':
-                    output.append(f"   Duration: {flight_info['duration']}")
-                if flight_info['stops'] != 'N/A':
-                    stops_text = "Direct flight" if flight_info['stops'] == 0 else f"{flight_info['stops']} stop(s)"
-                    output.append(f"   Stops: {stops_text}")
-                if flight_info['price'] != 'N/A':
-                    output.append(f"   Price: {flight_info['price']}")
-                if flight_info['delay']:
-                    output.append(f"   Delay: {flight_info['delay']}")
-                
-                output.append("")  # Empty line between flights
-
-            # Add helpful tips
-            output.append("💡 Tips:")
-            output.append("- Prices may vary and are subject to availability")
-            output.append("- Consider booking flexibility for better deals")
-            output.append("- Check airline websites for the most up-to-date information")
-            
-            result_text = "\n".join(output)
-            logger.info("Flight search completed successfully")
-            return result_text
+            # Compact JSON with short keys; the schema is documented in the tool description
+            summary: Dict[str, Any] = {"f": from_airport, "t": to_airport, "d": departure_date}
+            if is_round_trip:
+                summary["r"] = return_date
+            summary["cls"] = seat_class
+            summary["pax"] = [adults, children, infants_in_seat, infants_on_lap]
+            if getattr(result, 'current_price', None):
+                summary["trend"] = result.current_price
+
+            flights = sorted((getattr(result, 'flights', None) or [])[:10], key=_flight_sort_key)  # Top 10, best deals then cheapest
+            summary["p"] = [
+                entry for entry in (self._compact_flight(flight) for flight in flights) if entry
+            ]
+            if not summary["p"]:
+                summary["note"] = "No flights found; try other dates or nearby airports"
+
+            self._log_search_done(from_airport, to_airport, departure_date, len(summary["p"]), started)
+            return orjson.dumps(summary).decode()
 
         except Exception as e:
             error_msg = f"Error performing flight search: {str(e)}"
@@ -268,8 +387,9 @@ class FlightSearchTool(BaseTool):
                     return_date: Optional[str] = None, trip_type: str = "one-way",
                     seat_class: str = "economy", adults: int = 1, children: int = 0,
                     infants_in_seat: int = 0, infants_on_lap: int = 0) -> str:
-        """Async version of _run."""
-        return self._run(
+        """Async version of _run; fast-flights is synchronous, so the search runs in a worker thread."""
+        return await asyncio.to_thread(
+            self._run,
             from_airport=from_airport,
             to_airport=to_airport,
             departure_date=departure_date,
@@ -291,27 +411,27 @@ def test_flight_search():
         
         # Test with a simple one-way flight
         print("Testing one-way flight search...")
-        result = tool._run(
-            from_airport="LAX",
-            to_airport="JFK", 
-            departure_date="2025-08-15",
-            adults=1
-        )
+        result = tool.invoke({
+            "from_airport": "LAX",
+            "to_airport": "JFK", 
+            "departure_date": "2025-08-15",
+            "adults": 1
+        })
         print("One-way Flight Search Result:")
         print(result)
         print("\n" + "="*50 + "\n")
         
         # Test with round-trip flight
         print("Testing round-trip flight search...")
-        result = tool._run(
-            from_airport="SFO",
-            to_airport="NRT",
-            departure_date="2025-09-01",
-            return_date="2025-09-10",
-            trip_type="round-trip",
-            seat_class="business",
-            adults=2
-        )
+        result = tool.invoke({
+            "from_airport": "SFO",
+            "to_airport": "NRT",
+            "departure_date": "2025-09-01",
+            "return_date": "2025-09-10",
+            "trip_type": "round-trip",
+            "seat_class": "business",
+            "adults": 2
+        })
         print("Round-trip Flight Search Result:")
         print(result)
         
@@ -324,6 +444,7 @@ def test_flight_search():
 # Example usage and testing
 if __name__ == "__main__":
     # Test the flight search tool
+    logging.basicConfig(level=logging.INFO)
     print("Testing Flight Search Tool...")
     test_flight_search()
     
@@ -1,6 +1,11 @@
 # tools/google_custom_search.py
 import os
+import threading
+import orjson
 import requests
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,7 +13,25 @@ load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GOOGLE_CSE_ID = os.getenv("GOOGLE_CSE_ID")
 
+# Formatted results of recent searches; identical queries within 10 minutes skip the request
+_cache = TTLCache(maxsize=512, ttl=600)
+_cache_lock = threading.Lock()
+
+# Keep-alive session, so repeated searches reuse the TLS connection to www.googleapis.com
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504])
+))
+
 def google_custom_search(query, num_results=5):
+    cache_key = (query.strip().lower(), num_results)
+    with _cache_lock:
+        cached = _cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     url = "https://www.googleapis.com/customsearch/v1"
     params = {
         "key": GOOGLE_API_KEY,
@@ -17,17 +40,18 @@ def google_custom_search(query, num_results=5):
         "num": num_results
     }
 
-    response = requests.get(url, params=params)
-    results = response.json()
+    response = _session.get(url, params=params, timeout=10)
+    results = orjson.loads(response.content)
 
-    if "items" not in results:
+    items = results.get("items")
+    if not items:
         return "No results found."
 
-    output = ""
-    for item in results["items"]:
-        title = item.get("title")
-        snippet = item.get("snippet")
-        link = item.get("link")
-        output += f"{title}\n{snippet}\n{link}\n\n"
+    output = "\n\n".join(
+        f"{item.get('title')}\n{item.get('snippet')}\n{item.get('link')}" for item in items
+    ).strip()
 
-    return output.strip()
+    # Only searches that found something are cached, so empty or failed ones are retried
+    with _cache_lock:
+        _cache[cache_key] = output
+    return output
@@ -1,15 +1,40 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, ClassVar
 from langchain.tools import BaseTool
 import requests
+import httpx
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
 import logging
+import threading
+from cachetools import TTLCache
 from pydantic import BaseModel, Field
 from langchain_core.tools.base import ArgsSchema
 
-# Set up logging for debugging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+GEOCODE_ENDPOINT = "https://maps.googleapis.com/maps/api/geocode/json"
+PLACES_ENDPOINT = "https://maps.googleapis.com/maps/api/place/textsearch/json"
+# Only this many places are shown to the LLM, so only this many are converted
+MAX_RESULTS = 10
+
+# Module-level keep-alive session shared by all tool instances, so repeated calls
+# (and repeated tool construction) reuse the TLS connection to maps.googleapis.com
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504])
+))
+
+def preconnect(timeout: float = 2.0) -> None:
+    """Open the shared session's TLS connection to maps.googleapis.com ahead of the first search."""
+    try:
+        _session.head("https://maps.googleapis.com/", timeout=timeout)
+    except requests.exceptions.RequestException:
+        pass  # Best effort; real searches report connection problems
+
 class GoogleMapInput(BaseModel):
     query: str = Field(..., description="The search query for places or shops.")
     location: Optional[str] = Field(default=None, description="Optional location to refine the search (places).")
@@ -21,53 +46,98 @@ class GoogleMapSearchTool(BaseTool):
     description: str = (
         "Search for places or shops using Google Maps API. "
         "Input should be a query string describing the place or shop, and optionally a location. "
-        "This tool returns real places with names, addresses, and ratings. "
+        'Returns compact JSON: {"q":query,"near":location,"p":[{"n":name,"a":address,"r":rating,'
+        '"pl":price level 0-4,"ty":[types]}]}; unknown fields are omitted and "p" is empty when nothing matches. '
         "Use this to find actual places for budget planning, then incorporate the results into your response."
     )
     args_schema: Optional[ArgsSchema] = GoogleMapInput
     api_key: str = ""
     return_direct: bool = False  # Changed to False so the agent continues processing
 
+    # Shared across instances: identical place searches within 30 minutes skip the Places API
+    _cache: ClassVar[TTLCache] = TTLCache(maxsize=512, ttl=1800)
+    _cache_lock: ClassVar[threading.RLock] = threading.RLock()
+    # Geocoded coordinates rarely change, so they are kept for a day
+    _geo_cache: ClassVar[TTLCache] = TTLCache(maxsize=2048, ttl=86400)
+
     def __init__(self, api_key: str = None):
         super().__init__()
         self.api_key = api_key or os.getenv("GOOGLE_MAPS_API_KEY")
         if not self.api_key:
             raise ValueError("Google Maps API key must be provided either as parameter or GOOGLE_MAPS_API_KEY environment variable.")
-        logger.info("GoogleMapSearchTool initialized successfully")
+        logger.debug("GoogleMapSearchTool initialized successfully")
     def _get_lat_lng_from_location(self, location: str) -> Optional[str]:
         """Convert a location string to latitude and longitude."""
+        cache_key = location.strip().lower()
+        with self._cache_lock:
+            cached = self._geo_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Cache hit for geocoding: %s", location)
+            return cached
+
         try:
-            endpoint = "https://maps.googleapis.com/maps/api/geocode/json"
             params = {
                 "address": location,
                 "key": self.api_key
             }
-            logger.info(f"Geocoding location: {location}")
-            response = requests.get(endpoint, params=params)
+            logger.info("Geocoding location: %s", location)
+            response = _session.get(GEOCODE_ENDPOINT, params=params, timeout=10)
             response.raise_for_status()
-            
-            data = response.json()
-            if data.get("status") != "OK":
-                logger.error(f"Geocoding API error: {data.get('status')} - {data.get('error_message', 'Unknown error')}")
-                return None
-                
-            results = data.get("results", [])
-            if results:
-                lat_lng = results[0].get("geometry", {}).get("location", {})
-                coordinates = f"{lat_lng.get('lat')},{lat_lng.get('lng')}"
-                logger.info(f"Successfully geocoded {location} to {coordinates}")
-                return coordinates
-            else:
-                logger.warning(f"No geocoding results found for: {location}")
-                return None
+            return self._parse_geocode_response(location, cache_key, orjson.loads(response.content))
         except Exception as e:
-            logger.error(f"Error geocoding location {location}: {str(e)}")
+            logger.error("Error geocoding location %s: %s", location, e)
+            return None
+
+    async def _a_get_lat_lng_from_location(self, client: httpx.AsyncClient, location: str) -> Optional[str]:
+        """Async version of _get_lat_lng_from_location."""
+        cache_key = location.strip().lower()
+        with self._cache_lock:
+            cached = self._geo_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Cache hit for geocoding: %s", location)
+            return cached
+
+        try:
+            params = {
+                "address": location,
+                "key": self.api_key
+            }
+            logger.info("Geocoding location: %s", location)
+            response = await client.get(GEOCODE_ENDPOINT, params=params)
+            response.raise_for_status()
+            return self._parse_geocode_response(location, cache_key, orjson.loads(response.content))
+        except Exception as e:
+            logger.error("Error geocoding location %s: %s", location, e)
+            return None
+
+    def _parse_geocode_response(self, location: str, cache_key: str, data: Dict[str, Any]) -> Optional[str]:
+        """Extract coordinates from a Geocoding API response and cache them."""
+        if data.get("status") != "OK":
+            logger.error("Geocoding API error: %s - %s", data.get('status'), data.get('error_message', 'Unknown error'))
+            return None
+            
+        results = data.get("results", [])
+        if results:
+            lat_lng = results[0].get("geometry", {}).get("location", {})
+            coordinates = f"{lat_lng.get('lat')},{lat_lng.get('lng')}"
+            logger.info("Successfully geocoded %s to %s", location, coordinates)
+            with self._cache_lock:
+                self._geo_cache[cache_key] = coordinates
+            return coordinates
+        else:
+            logger.warning("No geocoding results found for: %s", location)
             return None
 
     def _search_places(self, query: str, location: str = None, radius: int = 5000) -> List[Dict[str, Any]]:
         """Search for places using Google Places API Text Search."""
+        cache_key = self._places_cache_key(query, location, radius)
+        with self._cache_lock:
+            cached = self._cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Cache hit for places search: %s", query)
+            return cached
+
         try:
-            endpoint = "https://maps.googleapis.com/maps/api/place/textsearch/json"
             params = {
                 "query": query,
                 "key": self.api_key,
@@ -76,92 +146,137 @@ class GoogleMapSearchTool(BaseTool):
             # Add location bias if provided
             if location:
                 coordinates = self._get_lat_lng_from_location(location)
-                if coordinates:
-                    params["location"] = coordinates
-                    params["radius"] = radius
-                    logger.info(f"Searching with location bias: {coordinates}, radius: {radius}m")
-                else:
-                    logger.warning(f"Could not geocode location: {location}, searching without location bias")
+                self._apply_location_bias(params, location, coordinates, radius)
             
-            logger.info(f"Searching for: {query}")
-            response = requests.get(endpoint, params=params)
+            logger.info("Searching for: %s", query)
+            response = _session.get(PLACES_ENDPOINT, params=params, timeout=10)
             response.raise_for_status()
-            
-            data = response.json()
-            status = data.get("status")
-            
-            if status == "OK":
-                results = data.get("results", [])
-                logger.info(f"Found {len(results)} results")
-                return [
-                    {
-                        "name": place.get("name"),
-                        "address": place.get("formatted_address"),
-                        "location": place.get("geometry", {}).get("location"),
-                        "rating": place.get("rating"),
-                        "types": place.get("types"),
-                        "place_id": place.get("place_id"),
-                        "price_level": place.get("price_level")
-                    }
-                    for place in results
-                ]
-            elif status == "ZERO_RESULTS":
-                logger.info("No places found for the query")
-                return []
-            elif status == "REQUEST_DENIED":
-                error_msg = data.get("error_message", "API request denied")
-                logger.error(f"API request denied: {error_msg}")
-                raise Exception(f"Google Places API request denied: {error_msg}")
-            elif status == "INVALID_REQUEST":
-                error_msg = data.get("error_message", "Invalid request")
-                logger.error(f"Invalid request: {error_msg}")
-                raise Exception(f"Invalid Google Places API request: {error_msg}")
-            elif status == "OVER_QUERY_LIMIT":
-                logger.error("API query limit exceeded")
-                raise Exception("Google Places API query limit exceeded")
-            else:
-                error_msg = data.get("error_message", f"Unknown status: {status}")
-                logger.error(f"API error: {error_msg}")
-                raise Exception(f"Google Places API error: {error_msg}")
+            return self._parse_places_response(cache_key, orjson.loads(response.content))
                 
         except requests.exceptions.RequestException as e:
-            logger.error(f"Network error during places search: {str(e)}")
+            logger.error("Network error during places search: %s", e)
             raise Exception(f"Network error: {str(e)}")
         except Exception as e:
-            logger.error(f"Error searching places: {str(e)}")
+            logger.error("Error searching places: %s", e)
             raise
 
-    def _run(self, query: str, location: str = None, radius: int = 5000) -> str:
-        """Return a string summary of the search results for the LLM."""
+    async def _a_search_places(self, client: httpx.AsyncClient, query: str, location: str = None, radius: int = 5000) -> List[Dict[str, Any]]:
+        """Async version of _search_places."""
+        cache_key = self._places_cache_key(query, location, radius)
+        with self._cache_lock:
+            cached = self._cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Cache hit for places search: %s", query)
+            return cached
+
         try:
-            logger.info(f"Running Google Maps search: query='{query}', location='{location}', radius={radius}")
-            places = self._search_places(query, location, radius)
-            
-            if not places:
-                return f"No results found for '{query}'" + (f" near '{location}'" if location else "")
+            params = {
+                "query": query,
+                "key": self.api_key,
+            }
             
-            output = [f"Found {len(places)} results for '{query}'" + (f" near '{location}'" if location else "") + ":\n"]
+            # Add location bias if provided
+            if location:
+                coordinates = await self._a_get_lat_lng_from_location(client, location)
+                self._apply_location_bias(params, location, coordinates, radius)
             
-            for idx, place in enumerate(places[:10], 1):  # Limit to top 10 results
-                rating_str = f"Rating: {place.get('rating', 'N/A')}"
-                price_str = f"Price Level: {place.get('price_level', 'N/A')}" if place.get('price_level') else ""
-                types_str = f"Types: {', '.join(place.get('types', [])[:3])}" if place.get('types') else ""
-                
-                result_line = f"{idx}. {place['name']}"
-                if place.get('address'):
-                    result_line += f" - {place['address']}"
-                result_line += f" ({rating_str}"
-                if price_str:
-                    result_line += f", {price_str}"
-                if types_str:
-                    result_line += f", {types_str}"
-                result_line += ")"
+            logger.info("Searching for: %s", query)
+            response = await client.get(PLACES_ENDPOINT, params=params)
+            response.raise_for_status()
+            return self._parse_places_response(cache_key, orjson.loads(response.content))
                 
-                output.append(result_line)
-            
-            result = "\n".join(output)
-            logger.info("Search completed successfully")
-            return result
+        except httpx.HTTPError as e:
+            logger.error("Network error during places search: %s", e)
+            raise Exception(f"Network error: {str(e)}")
+        except Exception as e:
+            logger.error("Error searching places: %s", e)
+            raise
+
+    @staticmethod
+    def _places_cache_key(query: str, location: Optional[str], radius: int) -> tuple:
+        """Case- and whitespace-insensitive key, so 'Coffee ' near ' Bangkok' reuses 'coffee' near 'bangkok'."""
+        return (query.lower().strip(), location.strip().lower() if location else None, radius)
+
+    def _apply_location_bias(self, params: Dict[str, Any], location: str, coordinates: Optional[str], radius: int):
+        """Add geocoded coordinates and radius to the Places request parameters."""
+        if coordinates:
+            params["location"] = coordinates
+            params["radius"] = radius
+            logger.info("Searching with location bias: %s, radius: %sm", coordinates, radius)
+        else:
+            logger.warning("Could not geocode location: %s, searching without location bias", location)
+
+    def _parse_places_response(self, cache_key: tuple, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Convert a Places API response into place dicts, raising on API errors."""
+        status = data.get("status")
+        
+        if status == "OK":
+            results = data.get("results", [])
+            logger.info("Found %s results", len(results))
+            places = [
+                {
+                    "name": place.get("name"),
+                    "address": place.get("formatted_address"),
+                    "location": place.get("geometry", {}).get("location"),
+                    "rating": place.get("rating"),
+                    "types": place.get("types"),
+                    "place_id": place.get("place_id"),
+                    "price_level": place.get("price_level")
+                }
+                for place in results[:MAX_RESULTS]
+            ]
+            # Only cache successful searches so transient failures are retried
+            if places:
+                with self._cache_lock:
+                    self._cache[cache_key] = places
+            return places
+        elif status == "ZERO_RESULTS":
+            logger.info("No places found for the query")
+            return []
+        elif status == "REQUEST_DENIED":
+            error_msg = data.get("error_message", "API request denied")
+            logger.error("API request denied: %s", error_msg)
+            raise Exception(f"Google Places API request denied: {error_msg}")
+        elif status == "INVALID_REQUEST":
+            error_msg = data.get("error_message", "Invalid request")
+            logger.error("Invalid request: %s", error_msg)
+            raise Exception(f"Invalid Google Places API request: {error_msg}")
+        elif status == "OVER_QUERY_LIMIT":
+            logger.error("API query limit exceeded")
+            raise Exception("Google Places API query limit exceeded")
+        else:
+            error_msg = data.get("error_message", f"Unknown status: {status}")
+            logger.error("API error: %s", error_msg)
+            raise Exception(f"Google Places API error: {error_msg}")
+
+    def _format_places(self, query: str, location: Optional[str], places: List[Dict[str, Any]]) -> str:
+        """Format place search results as compact JSON for the LLM, omitting empty fields."""
+        summary: Dict[str, Any] = {"q": query}
+        if location:
+            summary["near"] = location
+        summary["p"] = [
+            {
+                key: value
+                for key, value in (
+                    ("n", place.get('name')),
+                    ("a", place.get('address')),
+                    ("r", place.get('rating')),
+                    ("pl", place.get('price_level')),
+                    ("ty", (place.get('types') or [])[:3]),
+                )
+                if value or value == 0
+            }
+            for place in places
+        ]
+        logger.info("Search completed successfully")
+        return orjson.dumps(summary).decode()
+
+    def _run(self, query: str, location: str = None, radius: int = 5000) -> str:
+        """Return the search results as compact JSON for the LLM."""
+        try:
+            logger.info("Running Google Maps search: query='%s', location='%s', radius=%s", query, location, radius)
+            places = self._search_places(query, location, radius)
+            return self._format_places(query, location, places)
             
         except Exception as e:
             error_msg = f"Error performing Google Maps search: {str(e)}"
@@ -169,10 +284,17 @@ class GoogleMapSearchTool(BaseTool):
             return error_msg
 
     async def _arun(self, query: str, location: str = None, radius: int = 5000) -> str:
-        """Async version of _run."""
-        # For now, just call the sync version since requests is not async
-        # In production, you might want to use aiohttp for async requests
-        return self._run(query, location, radius)
+        """Async version of _run using non-blocking HTTP so concurrent tool calls overlap."""
+        try:
+            logger.info("Running Google Maps search: query='%s', location='%s', radius=%s", query, location, radius)
+            async with httpx.AsyncClient(timeout=10.0) as client:
+                places = await self._a_search_places(client, query, location, radius)
+            return self._format_places(query, location, places)
+            
+        except Exception as e:
+            error_msg = f"Error performing Google Maps search: {str(e)}"
+            logger.error(error_msg)
+            return error_msg
 
 # Test function to validate API connectivity
 def test_google_maps_api(api_key: str = None):
@@ -190,6 +312,7 @@ def test_google_maps_api(api_key: str = None):
 # Example usage and testing:
 if __name__ == "__main__":
     # Test the API
+    logging.basicConfig(level=logging.INFO)
     print("Testing Google Maps API...")
     test_google_maps_api()
     
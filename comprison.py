@@ -1,6 +1,35 @@
-import time
+import bisect
+import timeit
 import random
 
+import numpy as np
+
+# Each timing is the best of REPEAT runs; the minimum is the least noisy estimate
+REPEAT = 7
+
+
+def best_time(stmt, setup="pass", number=None, **namespace):
+    """Return the fastest per-call time of stmt (in seconds) over REPEAT runs.
+
+    Unless number is given, timeit.Timer.autorange picks a loop count large enough
+    (>= 0.2s per run) that sub-microsecond operations are measured reliably.
+    """
+    timer = timeit.Timer(stmt, setup=setup, globals=namespace)
+    if number is None:
+        number, _ = timer.autorange()
+    timings = timer.repeat(repeat=REPEAT, number=number)
+    return min(timings) / number
+
+
+def bisect_contains(a, x):
+    """O(log n) membership test on a sorted list using the C-implemented bisect module."""
+    i = bisect.bisect_left(a, x)
+    return i != len(a) and a[i] == x
+
+
+def print_row(operation, *times):
+    print(f"{operation}\t\t" + "\t".join(f"{t * 1e6:10.3f}" for t in times))
+
 
 def compare_data_structures():
 
@@ -15,98 +44,82 @@ def compare_data_structures():
     lst = sample_data.copy()
     tpl = tuple(sample_data)
     st = set(sample_data)
+    arr = np.array(sample_data)
 
-    print("Operation\tList\t\tTuple\t\tSet")
-    print("-" * 60)
+    print("Operation (µs)\tList\t\tTuple\t\tSet\t\tNumPy")
+    print("-" * 76)
 
-    
-    
-    
-    
-    add_elem = data_size + 1
-    start = time.time()
-    lst.append(add_elem)
-    list_add_time = time.time() - start
 
-    start = time.time()
-    tpl = tpl + (add_elem,)
-    tuple_add_time = time.time() - start
 
-    start = time.time()
-    st.add(add_elem)
-    set_add_time = time.time() - start
 
-    print(f"Add\t\t{list_add_time:.6f}\t{tuple_add_time:.6f}\t{set_add_time:.6f}")
+
+    # Mutating operations work on a fresh copy per run so every run sees the same input,
+    # which means they are timed one call per run rather than with an autoranged loop
+    add_elem = data_size + 1
+    list_add_time = best_time("s.append(x)", "s = src.copy()", number=1, src=lst, x=add_elem)
+    tuple_add_time = best_time("s + (x,)", s=tpl, x=add_elem)
+    set_add_time = best_time("s.add(x)", "s = src.copy()", number=1, src=st, x=add_elem)
+    numpy_add_time = best_time("np.append(a, x)", np=np, a=arr, x=add_elem)
+
+    print_row("Add", list_add_time, tuple_add_time, set_add_time, numpy_add_time)
 
     # Remove
     rem_elem = sample_data[0]
-    start = time.time()
-    lst.remove(rem_elem)
-    list_rem_time = time.time() - start
+    list_rem_time = best_time("s.remove(x)", "s = src.copy()", number=1, src=lst, x=rem_elem)
+    tuple_rem_time = best_time("tuple(y for y in s if y != x)", s=tpl, x=rem_elem)
+    set_rem_time = best_time("s.remove(x)", "s = src.copy()", number=1, src=st, x=rem_elem)
+    numpy_rem_time = best_time("a[a != x]", a=arr, x=rem_elem)
+
+    print_row("Remove", list_rem_time, tuple_rem_time, set_rem_time, numpy_rem_time)
+
 
-    start = time.time()
-    tpl = tuple(x for x in tpl if x != rem_elem)
-    tuple_rem_time = time.time() - start
 
-    start = time.time()
-    st.remove(rem_elem)
-    set_rem_time = time.time() - start
 
-    print(f"Remove\t\t{list_rem_time:.6f}\t{tuple_rem_time:.6f}\t{set_rem_time:.6f}")
 
-    
-    
-    
-    
     search_elem = sample_data[data_size // 2] # Get middle Element
-    start = time.time()
-    _ = search_elem in lst
-    list_search_time = time.time() - start
+    list_search_time = best_time("x in s", s=lst, x=search_elem)
+    tuple_search_time = best_time("x in s", s=tpl, x=search_elem)
+    set_search_time = best_time("x in s", s=st, x=search_elem)
+    numpy_search_time = best_time("(a == x).any()", a=arr, x=search_elem)
 
-    start = time.time()
-    _ = search_elem in tpl
-    tuple_search_time = time.time() - start
+    print_row("Search", list_search_time, tuple_search_time, set_search_time, numpy_search_time)
 
-    start = time.time()
-    _ = search_elem in st
-    set_search_time = time.time() - start
 
-    print(f"Search\t\t{list_search_time:.6f}\t{tuple_search_time:.6f}\t{set_search_time:.6f}")
 
-    
-    
-    
-    
-    start = time.time()
-    tuple(lst)
-    list_convert_time = time.time() - start
 
-    start = time.time()
-    list(tpl)
-    tuple_convert_time = time.time() - start
 
-    start = time.time()
-    list(st)
-    set_convert_time = time.time() - start
+    list_convert_time = best_time("tuple(s)", s=lst)
+    tuple_convert_time = best_time("list(s)", s=tpl)
+    set_convert_time = best_time("list(s)", s=st)
+    numpy_convert_time = best_time("a.tolist()", a=arr)
 
-    print(f"Convert\t\t{list_convert_time:.6f}\t{tuple_convert_time:.6f}\t{set_convert_time:.6f}")
+    print_row("Convert", list_convert_time, tuple_convert_time, set_convert_time, numpy_convert_time)
 
 
 
 
-    start = time.time()
-    sorted(lst)
-    list_sort_time = time.time() - start
+    list_sort_time = best_time("sorted(s)", s=lst)
+    tuple_sort_time = best_time("sorted(s)", s=tpl)
+    set_sort_time = best_time("sorted(s)", s=st)
+    numpy_sort_time = best_time("np.sort(a)", np=np, a=arr)
 
-    start = time.time()
-    sorted(tpl)
-    tuple_sort_time = time.time() - start
+    print_row("Sort", list_sort_time, tuple_sort_time, set_sort_time, numpy_sort_time)
 
-    start = time.time()
-    sorted(st)
-    set_sort_time = time.time() - start
+    # Membership alternatives: build the lookup structure once, then query it many times
+    frozen = frozenset(sample_data)
+    frozenset_search_time = best_time("x in s", s=frozen, x=search_elem)
+    sorted_lst = sorted(sample_data)
+    bisect_search_time = best_time("contains(s, x)", contains=bisect_contains, s=sorted_lst, x=search_elem)
 
-    print(f"Sort\t\t{list_sort_time:.6f}\t{tuple_sort_time:.6f}\t{set_sort_time:.6f}")
+    print()
+    print("Search (µs)\t\tTime\t\tvs List")
+    print("-" * 44)
+    for name, search_time in (
+        ("list (in)", list_search_time),
+        ("bisect (sorted)", bisect_search_time),
+        ("frozenset (in)", frozenset_search_time),
+    ):
+        print(f"{name}\t\t{search_time * 1e6:10.3f}\t{list_search_time / search_time:8.1f}x")
 
 if __name__ == "__main__":
-    compare_data_structures()
\ No newline at end of file
+    compare_data_structures()
@@ -4,11 +4,77 @@ Debug script for Google Maps API issues.
 This script will help identify common problems with the Google Maps API setup.
 """
 
+import hashlib
 import os
+import sqlite3
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from Tools.google_map_search import GoogleMapSearchTool, test_google_maps_api
 
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+PLACES_URL = "https://maps.googleapis.com/maps/api/place/textsearch/json"
+
+# Successful probe responses are kept on disk so repeat debug runs don't spend quota
+CACHE_PATH = os.path.expanduser("~/.aibudget_cache.sqlite")
+GEOCODE_TTL = 30 * 24 * 3600
+PLACES_TTL = 24 * 3600
+# (connect, read) seconds, so a stalled connection can't hang the debug run
+REQUEST_TIMEOUT = (3.05, 10)
+
+# One keep-alive session so the Places probe reuses the Geocoding probe's TLS connection
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+def _preconnect():
+    """Open the TLS connection to maps.googleapis.com in the background so the first probe can reuse it."""
+    def warm_up():
+        try:
+            _SESSION.head("https://maps.googleapis.com/", timeout=2)
+        except requests.exceptions.RequestException:
+            pass  # Best effort; the probes report real connection problems
+    threading.Thread(target=warm_up, daemon=True).start()
+
+def _cache_key(url, params):
+    """Hash the whole request, API key included, so a result cached for one key never vouches for another."""
+    return hashlib.sha256(orjson.dumps([url, sorted(params.items())])).hexdigest()
+
+def _summarize(data):
+    """Keep only what the health check reports; the place details are never shown."""
+    summary = {"status": data.get("status"), "result_count": len(data.get("results", []))}
+    if "error_message" in data:
+        summary["error_message"] = data["error_message"]
+    return summary
+
+def cached_get(url, params, ttl):
+    """GET a Maps endpoint and return a status summary, reusing a cached OK summary younger than ttl."""
+    key = _cache_key(url, params)
+    with sqlite3.connect(CACHE_PATH) as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS probe_summaries (key TEXT PRIMARY KEY, body BLOB, ts INTEGER)")
+        row = conn.execute("SELECT body, ts FROM probe_summaries WHERE key = ?", (key,)).fetchone()
+        if row and time.time() - row[1] < ttl:
+            return orjson.loads(row[0])
+
+        response = _SESSION.get(url, params=params, timeout=REQUEST_TIMEOUT)
+        summary = _summarize(orjson.loads(response.content))
+        # Error statuses are what this tool diagnoses, so only successes are cached.
+        # Storing the summary rather than the full body keeps cache hits tiny to load.
+        if summary["status"] == "OK":
+            conn.execute(
+                "INSERT OR REPLACE INTO probe_summaries (key, body, ts) VALUES (?, ?, ?)",
+                (key, orjson.dumps(summary), int(time.time()))
+            )
+        return summary
+
 def check_api_key():
     """Check if API key is available."""
     api_key = os.getenv("GOOGLE_MAPS_API_KEY")
@@ -16,48 +82,64 @@ def check_api_key():
         print("❌ GOOGLE_MAPS_API_KEY environment variable not found")
         return None
     else:
-        print(f"✅ API key found: {api_key[:10]}...{api_key[-4:] if len(api_key) > 14 else api_key}")
+        masked = f"{api_key[:10]}...{api_key[-4:]}" if len(api_key) > 14 else api_key
+        print(f"✅ API key found: {masked}")
         return api_key
 
-def check_api_permissions(api_key):
-    """Check which APIs are enabled for the given key."""
-    print("\n🔍 Checking API permissions...")
-    
-    # Test Geocoding API
-    print("Testing Geocoding API...")
+def _probe(name, url, params, ttl):
+    """Run one API probe, returning (name, data, exception) instead of raising."""
     try:
-        response = requests.get(
-            "https://maps.googleapis.com/maps/api/geocode/json",
-            params={"address": "Bangkok", "key": api_key}
-        )
-        data = response.json()
-        if data.get("status") == "OK":
-            print("✅ Geocoding API: Working")
-        else:
-            print(f"❌ Geocoding API Error: {data.get('status')} - {data.get('error_message', 'Unknown error')}")
+        return name, cached_get(url, params, ttl), None
+    except requests.exceptions.Timeout as e:
+        return name, None, f"request timed out after {REQUEST_TIMEOUT[0]}s connect / {REQUEST_TIMEOUT[1]}s read ({e})"
     except Exception as e:
-        print(f"❌ Geocoding API Exception: {e}")
-    
-    # Test Places API
-    print("Testing Places API...")
-    try:
-        response = requests.get(
-            "https://maps.googleapis.com/maps/api/place/textsearch/json",
-            params={"query": "restaurant Bangkok", "key": api_key}
-        )
-        data = response.json()
-        if data.get("status") == "OK":
-            print("✅ Places API: Working")
-            print(f"   Found {len(data.get('results', []))} results")
+        return name, None, e
+
+KEY_ERROR_STATUSES = {"REQUEST_DENIED", "INVALID_REQUEST", "OVER_QUERY_LIMIT"}
+
+def _is_key_error(data):
+    """True when the response blames the API key itself, so every other call will fail too."""
+    return (data.get("status") in KEY_ERROR_STATUSES
+            and "API key" in data.get("error_message", ""))
+
+def check_api_permissions(api_key):
+    """Check which APIs are enabled for the given key.
+
+    Returns False when Google rejected the key itself, so later checks can be skipped.
+    """
+    print("\n🔍 Checking API permissions...")
+    print("Testing Geocoding API and Places API...")
+
+    # The probes are independent, so run them together and wait for the slower one
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(_probe, "Geocoding", GEOCODE_URL, {"address": "Bangkok", "key": api_key}, GEOCODE_TTL),
+            executor.submit(_probe, "Places", PLACES_URL, {"query": "restaurant Bangkok", "key": api_key}, PLACES_TTL),
+        ]
+        # Report in a fixed order so the output reads the same on every run
+        results = [future.result() for future in futures]
+
+    for name, data, exc in results:
+        if exc is not None:
+            print(f"❌ {name} API Exception: {exc}")
+        elif data.get("status") == "OK":
+            print(f"✅ {name} API: Working")
+            if name == "Places":
+                print(f"   Found {data['result_count']} results")
         else:
-            print(f"❌ Places API Error: {data.get('status')} - {data.get('error_message', 'Unknown error')}")
-            if data.get("status") == "REQUEST_DENIED":
+            print(f"❌ {name} API Error: {data.get('status')} - {data.get('error_message', 'Unknown error')}")
+            if name == "Places" and data.get("status") == "REQUEST_DENIED":
                 print("   💡 This usually means:")
                 print("      - Places API is not enabled in Google Cloud Console")
                 print("      - API key doesn't have permission for Places API")
                 print("      - Billing is not set up")
-    except Exception as e:
-        print(f"❌ Places API Exception: {e}")
+
+    geocode_data = results[0][1]
+    if geocode_data is not None and _is_key_error(geocode_data):
+        print("\n⛔ The API key itself was rejected, skipping further API tests.")
+        print("   💡 Check that the key is copied correctly and its restrictions allow these APIs.")
+        return False
+    return True
 
 def run_full_test(api_key):
     """Run the full Google Maps tool test."""
@@ -72,6 +154,7 @@ def run_full_test(api_key):
         print(f"❌ GoogleMapSearchTool test exception: {e}")
 
 def main():
+    _preconnect()
     print("🔧 Google Maps API Debug Tool")
     print("=" * 40)
     
@@ -86,11 +169,9 @@ def main():
         print("      export GOOGLE_MAPS_API_KEY='your_api_key_here'")
         return
     
-    # Check API permissions
-    check_api_permissions(api_key)
-    
-    # Run full test
-    run_full_test(api_key)
+    # Check API permissions; the full tool test would only repeat a key rejection
+    if check_api_permissions(api_key):
+        run_full_test(api_key)
     
     print("\n📋 Common Solutions:")
     print("   1. Enable APIs in Google Cloud Console:")
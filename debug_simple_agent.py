@@ -4,11 +4,32 @@ Debug version to test agent tool calling.
 """
 
 import os
+import sys
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.agents import create_tool_calling_agent, AgentExecutor
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.globals import set_llm_cache
+from langchain_community.cache import SQLiteCache
 from Tools.google_map_search import GoogleMapSearchTool
 
+# Identical prompts across runs are answered from disk instead of calling Gemini again
+set_llm_cache(SQLiteCache(database_path=".aibp_llm_cache.sqlite"))
+
+# Built once at import so repeated debug_agent() calls don't re-parse the template
+AGENT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a helpful assistant. You have access to a GoogleMapSearch tool.
+    When asked to find places, you MUST use the GoogleMapSearch tool.
+    
+    The tool takes these parameters:
+    - query (required): what to search for (e.g., "coffee shop", "restaurant")
+    - location (optional): where to search (e.g., "Bangkok", "New York")
+    - radius (optional): search radius in meters (default 5000)
+    
+    ALWAYS call the GoogleMapSearch tool when asked to find places. Do not provide hypothetical results!"""),
+    ("human", "{input}"),
+    ("placeholder", "{agent_scratchpad}")
+])
+
 def debug_agent():
     """Debug the agent tool calling."""
     
@@ -35,23 +56,8 @@ def debug_agent():
         print(f"Tool description: {map_tool.description}")
         print(f"Return direct: {map_tool.return_direct}")
         
-        print("🔧 Creating simple agent prompt...")
-        agent_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a helpful assistant. You have access to a GoogleMapSearch tool.
-            When asked to find places, you MUST use the GoogleMapSearch tool.
-            
-            The tool takes these parameters:
-            - query (required): what to search for (e.g., "coffee shop", "restaurant")
-            - location (optional): where to search (e.g., "Bangkok", "New York")
-            - radius (optional): search radius in meters (default 5000)
-            
-            ALWAYS call the GoogleMapSearch tool when asked to find places. Do not provide hypothetical results!"""),
-            ("human", "{input}"),
-            ("placeholder", "{agent_scratchpad}")
-        ])
-        
         print("🔧 Creating agent...")
-        agent = create_tool_calling_agent(llm, tools, agent_prompt)
+        agent = create_tool_calling_agent(llm, tools, AGENT_PROMPT)
         
         print("🔧 Creating agent executor...")
         agent_executor = AgentExecutor(
@@ -83,17 +89,22 @@ def debug_agent():
             print("\n" + "="*50)
             print("INTERMEDIATE STEPS:")
             print("="*50)
-            for step in result["intermediate_steps"]:
-                print(f"Action: {step[0]}")
-                print(f"Result: {step[1]}")
-                print("-" * 30)
+            # Build the whole report first and write it once rather than three prints per step
+            report = "\n".join(
+                f"Action: {action}\nResult: {observation}\n{'-' * 30}"
+                for action, observation in result["intermediate_steps"]
+            )
+            sys.stdout.write(report + "\n")
         
         return True
         
     except Exception as e:
         print(f"❌ Debug test failed: {e}")
-        import traceback
-        traceback.print_exc()
+        if os.getenv("AIBP_DEBUG"):
+            import traceback
+            traceback.print_exc()
+        else:
+            print("   Set AIBP_DEBUG=1 to print the full traceback")
         return False
 
 if __name__ == "__main__":
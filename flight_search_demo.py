@@ -4,17 +4,41 @@ Example usage of the FlightSearchTool in the AI Budget Planner context.
 This demonstrates how the flight search tool integrates with LangChain agents.
 """
 
+import argparse
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.agents import create_tool_calling_agent, AgentExecutor
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.globals import set_llm_cache
+from langchain_community.cache import SQLiteCache
 from Tools.flight_search import FlightSearchTool
 
-def demo_flight_search_agent():
+# Identical prompts across runs are answered from disk instead of calling Gemini again
+set_llm_cache(SQLiteCache(database_path=".aibp_llm_cache.sqlite"))
+
+# Built once at import so repeated demo runs don't re-parse the template
+AGENT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a helpful travel budget assistant. You have access to a FlightSearch tool that can find real flight prices and information from Google Flights.
+
+When users ask about flights or travel budgets, use the FlightSearch tool to get actual flight prices and details. Always specify:
+- from_airport and to_airport using IATA codes (like LAX, JFK, CDG)
+- departure_date in YYYY-MM-DD format
+- For round trips, include return_date and set trip_type="round-trip"
+- Number of passengers (adults, children, etc.)
+
+Provide helpful budget advice based on the real flight prices you find."""),
+    ("human", "{input}"),
+    ("placeholder", "{agent_scratchpad}")
+])
+
+def demo_flight_search_agent(api_key=None):
     """Demonstrate flight search integration with LangChain agent."""
     
     # Note: In production, get API key from environment or Streamlit secrets
-    api_key = input("Enter your Google API Key (or press Enter to skip): ").strip()
+    if not api_key and sys.stdin.isatty():
+        api_key = input("Enter your Google API Key (or press Enter to skip): ").strip()
     if not api_key:
         print("Skipping agent demo - no API key provided")
         return
@@ -32,23 +56,8 @@ def demo_flight_search_agent():
         flight_tool = FlightSearchTool()
         tools = [flight_tool]
         
-        # Create agent prompt
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a helpful travel budget assistant. You have access to a FlightSearch tool that can find real flight prices and information from Google Flights.
-
-When users ask about flights or travel budgets, use the FlightSearch tool to get actual flight prices and details. Always specify:
-- from_airport and to_airport using IATA codes (like LAX, JFK, CDG)
-- departure_date in YYYY-MM-DD format
-- For round trips, include return_date and set trip_type="round-trip"
-- Number of passengers (adults, children, etc.)
-
-Provide helpful budget advice based on the real flight prices you find."""),
-            ("human", "{input}"),
-            ("placeholder", "{agent_scratchpad}")
-        ])
-        
         # Create agent
-        agent = create_tool_calling_agent(llm, tools, prompt)
+        agent = create_tool_calling_agent(llm, tools, AGENT_PROMPT)
         agent_executor = AgentExecutor(
             agent=agent,
             tools=tools,
@@ -86,7 +95,7 @@ Provide helpful budget advice based on the real flight prices you find."""),
     except Exception as e:
         print(f"❌ Failed to initialize agent: {e}")
 
-def demo_direct_flight_search():
+def demo_direct_flight_search(pause=True):
     """Demonstrate direct flight search without agent."""
     print("\n" + "=" * 60)
     print("Direct Flight Search Demo")
@@ -118,29 +127,49 @@ def demo_direct_flight_search():
         }
     ]
     
-    for i, example in enumerate(examples, 1):
-        print(f"\n--- Example {i}: {example['description']} ---")
+    def run_example(example):
         try:
-            result = tool._run(**example['params'])
-            print(result)
+            return tool.invoke(example["params"])
         except Exception as e:
-            print(f"Error: {e}")
+            return f"Error: {e}"
+    
+    # The searches are independent, so fetch them all at once and print in order
+    with ThreadPoolExecutor(max_workers=len(examples)) as executor:
+        results = list(executor.map(run_example, examples))
+    
+    for i, (example, result) in enumerate(zip(examples, results), 1):
+        print(f"\n--- Example {i}: {example['description']} ---")
+        print(result)
         
-        if i < len(examples):
+        if pause and i < len(examples):
             input("\nPress Enter to continue to next example...")
 
+def parse_args(argv=None):
+    """Command line options so the demo can run unattended, e.g. for timing runs."""
+    parser = argparse.ArgumentParser(description="Flight search tool integration demo")
+    parser.add_argument("--mode", choices=["direct", "agent"],
+                        help="Demo to run; asks interactively when omitted")
+    parser.add_argument("--api-key", default=os.getenv("GOOGLE_API_KEY"),
+                        help="Google API key for the agent demo (default: $GOOGLE_API_KEY)")
+    parser.add_argument("--no-pause", action="store_true",
+                        help="Don't wait for Enter between direct search examples")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
+    args = parse_args()
     print("✈️ Flight Search Tool Integration Demo")
     print("This demonstrates the flight search capabilities in the AI Budget Planner")
     
-    choice = input("\nChoose demo:\n1. Direct flight search\n2. Agent integration (requires Google API key)\n\nEnter 1 or 2: ").strip()
+    mode = args.mode
+    if mode is None and sys.stdin.isatty():
+        choice = input("\nChoose demo:\n1. Direct flight search\n2. Agent integration (requires Google API key)\n\nEnter 1 or 2: ").strip()
+        mode = {"1": "direct", "2": "agent"}.get(choice)
+        if mode is None:
+            print("Invalid choice. Running direct flight search demo...")
     
-    if choice == "1":
-        demo_direct_flight_search()
-    elif choice == "2":
-        demo_flight_search_agent()
+    if mode == "agent":
+        demo_flight_search_agent(args.api_key)
     else:
-        print("Invalid choice. Running direct flight search demo...")
-        demo_direct_flight_search()
+        demo_direct_flight_search(pause=not args.no_pause and sys.stdin.isatty())
     
     print("\n🎉 Demo completed!")
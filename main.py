@@ -1,21 +1,41 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
+import asyncio
+import copy
+import csv
+import hashlib
+import io
 import json
-from dataclasses import dataclass, asdict
-from typing import List, Dict, Any, Optional
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain.chains import LLMChain # Not needed if using LCEL
-from langchain.agents import create_tool_calling_agent, AgentExecutor
-from langchain_core.prompts import ChatPromptTemplate
-
-#Tool imports
-from Tools.google_map_search import GoogleMapSearchTool
-from Tools.flight_search import FlightSearchTool
+import logging
+import queue
+import re
+import threading
+from collections import deque
+from dataclasses import dataclass, asdict, fields
+from functools import lru_cache
+from operator import attrgetter
+from uuid import uuid4
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+from cachetools import TTLCache
+
+# LangChain, Gemini and the tool modules take over a second to import, so they are
+# imported inside the cached agent factory and the page renders without them.
+# Plotly's figure classes are likewise imported only when a chart is built.
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+    from langchain.agents import AgentExecutor
+    from langchain_community.cache import SQLiteCache
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.runnables import Runnable
+
+# Tool modules only create loggers; the app entry point decides how they are emitted
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Generated plans kept per session so earlier ones can be reopened without calling the agent
+PLAN_HISTORY_SIZE = 10
+# Agent runs kept for the debug panel, which shows only these
+AGENT_DEBUG_HISTORY_SIZE = 5
 
 # Currency symbols tuple - could be created with comprehension for more complex scenarios
 cur_symbols = ("USD", "EUR", "GBP", "INR", "AUD", "CAD", "JPY", "CNY", "RUB", "BRL", "THB")
@@ -28,7 +48,8 @@ currency_groups = {
 }
 
 # Timeline Data Structures
-@dataclass
+# Items are immutable (edits build a new item) and slotted, so they are hashable and compact
+@dataclass(slots=True, frozen=True)
 class TimelineItem:
     """Represents a single item in the budget timeline"""
     id: str
@@ -47,7 +68,11 @@ class TimelineItem:
 
 @dataclass
 class BudgetTimeline:
-    """Main timeline container with budget tracking"""
+    """Main timeline container with budget tracking
+
+    Change items through add_item, remove_item and update_item, which keep the running
+    total cost in step; mutating the items list directly would leave total_cost stale.
+    """
     items: List[TimelineItem]
     total_budget: float
     currency: str
@@ -55,9 +80,41 @@ class BudgetTimeline:
     end_date: str
     location: str
     
+    def __post_init__(self):
+        # Running total and id -> position index, kept outside the dataclass fields so
+        # exports (timeline_dict) stay unchanged
+        self._total_cost = sum(item.cost for item in self.items)
+        self._positions = {item.id: index for index, item in enumerate(self.items)}
+    
+    def get_item(self, item_id: str) -> Optional[TimelineItem]:
+        index = self._positions.get(item_id)
+        return None if index is None else self.items[index]
+    
+    def add_item(self, item: TimelineItem):
+        self._positions[item.id] = len(self.items)
+        self.items.append(item)
+        self._total_cost += item.cost
+    
+    def remove_item(self, item_id: str):
+        index = self._positions.pop(item_id, None)
+        if index is None:
+            return
+        removed = self.items.pop(index)
+        self._total_cost -= removed.cost
+        # Items after the removed one each move up a position
+        for later in self.items[index:]:
+            self._positions[later.id] -= 1
+    
+    def update_item(self, item: TimelineItem):
+        """Replace the item with the same id in place"""
+        index = self._positions.get(item.id)
+        if index is not None:
+            self._total_cost += item.cost - self.items[index].cost
+            self.items[index] = item
+    
     @property
     def total_cost(self) -> float:
-        return sum(item.cost for item in self.items)
+        return self._total_cost
     
     @property
     def remaining_budget(self) -> float:
@@ -67,8 +124,38 @@ class BudgetTimeline:
     def budget_utilization(self) -> float:
         return (self.total_cost / self.total_budget) * 100 if self.total_budget > 0 else 0
 
+# Chronological sort key: (date, time) tuples built in C, no per-item string formatting
+ITEM_SORT_KEY = attrgetter("date", "time")
+
+@lru_cache(maxsize=4096)
+def parse_item_datetime(date: str, time: str) -> datetime:
+    """Parse an item's YYYY-MM-DD date and HH:MM time; cached since the same strings recur every rerun"""
+    return datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
+
+# CSV export columns, in TimelineItem field order
+TIMELINE_ITEM_FIELDS = tuple(field.name for field in fields(TimelineItem))
+
+@lru_cache(maxsize=4096)
+def timeline_item_dict(item: TimelineItem) -> Dict[str, Any]:
+    """asdict() of an item for exports. Items are frozen, so an edit is a new cache key; don't mutate the result"""
+    return asdict(item)
+
+def timeline_dict(timeline: BudgetTimeline) -> Dict[str, Any]:
+    """Same as asdict(timeline), but reusing the cached item dicts"""
+    return {
+        'items': [timeline_item_dict(item) for item in timeline.items],
+        'total_budget': timeline.total_budget,
+        'currency': timeline.currency,
+        'start_date': timeline.start_date,
+        'end_date': timeline.end_date,
+        'location': timeline.location,
+    }
+
 # Constants
 NOT_SPECIFIED = "Not specified"
+EXAMPLE_ACTIVITIES = "Round-trip flight from LAX to JFK on 2025-08-15 returning 2025-08-20, 3 restaurant meals in New York, visit Central Park attractions, 2 Broadway show tickets"
+SEARCH_CATEGORY_OPTIONS = ("", "Food", "Transport", "Entertainment", "Activities")
+NESTED_CATEGORY_OPTIONS = ("", "Accommodation", "Shopping", "Culture")
 
 # Timeline Categories
 TIMELINE_CATEGORIES = {
@@ -85,9 +172,17 @@ TIMELINE_CATEGORIES = {
     "🎨 Culture": "#FFB3BA",
     "🌿 Nature": "#B8E6B8"
 }
+# Editor selectbox options and each category's position in them
+TIMELINE_CATEGORY_KEYS = tuple(TIMELINE_CATEGORIES)
+TIMELINE_CATEGORY_INDEX = {category: i for i, category in enumerate(TIMELINE_CATEGORY_KEYS)}
+# Card label of each category (its first word after the emoji), split once rather than per card
+CATEGORY_LABEL = {
+    category: category.split(' ')[1] if ' ' in category else category
+    for category in TIMELINE_CATEGORIES
+}
 
 # Recursive Budget Analysis Functions
-@dataclass
+@dataclass(slots=True)
 class BudgetNode:
     """Represents a node in the hierarchical budget tree"""
     name: str
@@ -106,9 +201,33 @@ class BudgetNode:
     def utilization_rate(self) -> float:
         return (self.actual_cost / self.allocated_budget * 100) if self.allocated_budget > 0 else 0
 
+def _date_nodes(dates: Dict[str, List[TimelineItem]], date_costs: Dict[str, float], parent_budget: float,
+                parent_count: int, parent_category: str, name_prefix: str = "") -> List[BudgetNode]:
+    """Leaf nodes for one location's date groups, splitting parent_budget by item count"""
+    return [
+        BudgetNode(
+            name=f"{name_prefix}{date}",
+            allocated_budget=parent_budget * (len(date_items) / parent_count),
+            actual_cost=date_costs[date],
+            children=[],
+            items=date_items,
+            category=f"{parent_category} - {date}"
+        )
+        for date, date_items in dates.items()
+    ]
+
 def create_hierarchical_budget_tree(timeline: BudgetTimeline, budget_rules: Dict[str, Dict] = None) -> BudgetNode:
     """
-    Recursively creates a hierarchical budget breakdown tree from timeline items.
+    Creates a hierarchical budget breakdown tree (Category → Location → Date) from timeline items.
+    
+    Items are grouped at all three levels in a single pass, costs are summed bottom-up
+    (dates → locations → categories) so each item's cost is read once, and the nodes
+    are built from the groups without rescanning the items.
+    
+    Subdivision rules:
+        - A category with several items in several locations gets one child per location,
+          and each such location with several dates gets one child per date
+        - A category with more than two items in one location gets one child per date
     
     Args:
         timeline: The budget timeline containing all items
@@ -134,21 +253,40 @@ def create_hierarchical_budget_tree(timeline: BudgetTimeline, budget_rules: Dict
         allocated_budget=timeline.total_budget,
         actual_cost=timeline.total_cost,
         children=[],
-        items=timeline.items,
+        # A copy, so the tree doesn't change when items are later added to or removed from the timeline
+        items=list(timeline.items),
         category="root"
     )
     
-    # Group items by category
-    category_items = {}
+    # Single pass grouping items by category, location and date, keeping first-seen order:
+    # category -> (items, {location -> (items, {date -> items})})
+    categories: Dict[str, Tuple[List[TimelineItem], Dict[str, Any]]] = {}
     for item in timeline.items:
-        category = item.category
-        if category not in category_items:
-            category_items[category] = []
-        category_items[category].append(item)
-    
-    # Create child nodes for each category
-    for category, items in category_items.items():
-        actual_cost = sum(item.cost for item in items)
+        category_entry = categories.get(item.category)
+        if category_entry is None:
+            category_entry = categories[item.category] = ([], {})
+        category_entry[0].append(item)
+        
+        location = item.location or "Unknown Location"
+        location_entry = category_entry[1].get(location)
+        if location_entry is None:
+            location_entry = category_entry[1][location] = ([], {})
+        location_entry[0].append(item)
+        
+        date_items = location_entry[1].get(item.date)
+        if date_items is None:
+            location_entry[1][item.date] = [item]
+        else:
+            date_items.append(item)
+    
+    for category, (category_items, locations) in categories.items():
+        # Costs are summed bottom-up: each item once at the date level, then date totals
+        # into location totals and location totals into the category total
+        date_costs = {
+            location: {date: sum(item.cost for item in date_items) for date, date_items in dates.items()}
+            for location, (_, dates) in locations.items()
+        }
+        location_costs = {location: sum(costs.values()) for location, costs in date_costs.items()}
         
         # Calculate allocated budget based on rules
         rule = budget_rules.get(category, {"percentage": 0.10, "priority": 3})
@@ -157,139 +295,43 @@ def create_hierarchical_budget_tree(timeline: BudgetTimeline, budget_rules: Dict
         category_node = BudgetNode(
             name=category,
             allocated_budget=allocated_budget,
-            actual_cost=actual_cost,
+            actual_cost=sum(location_costs.values()),
             children=[],
-            items=items,
+            items=category_items,
             category=category,
             priority_level=rule["priority"]
         )
         
-        # Recursively create sub-categories based on location or date
-        category_node.children = create_budget_subcategories(items, allocated_budget, category)
-        root.children.append(category_node)
-    
-    return root
-
-def create_budget_subcategories(items: List[TimelineItem], parent_budget: float, parent_category: str) -> List[BudgetNode]:
-    """
-    Recursively creates subcategories for budget items.
-    Base case: If fewer than 2 items, no need to subdivide.
-    
-    Args:
-        items: List of timeline items to categorize
-        parent_budget: Budget allocated to parent category
-        parent_category: Parent category name
-    
-    Returns:
-        List of BudgetNode children representing subcategories
-    """
-    # Base case: Not enough items to subdivide
-    if len(items) <= 1:
-        return []
-    
-    subcategories = []
-    
-    # Recursive case 1: Group by location if items have different locations
-    locations = {}
-    for item in items:
-        location = item.location if item.location else "Unknown Location"
-        if location not in locations:
-            locations[location] = []
-        locations[location].append(item)
-    
-    # If we have multiple locations, create location-based subcategories
-    if len(locations) > 1:
-        for location, location_items in locations.items():
-            actual_cost = sum(item.cost for item in location_items)
-            # Proportionally allocate budget based on item count
-            allocated_budget = parent_budget * (len(location_items) / len(items))
-            
-            location_node = BudgetNode(
-                name=f"{location}",
-                allocated_budget=allocated_budget,
-                actual_cost=actual_cost,
-                children=[],
-                items=location_items,
-                category=f"{parent_category} - {location}"
-            )
-            
-            # Recursively subdivide by date if we have multiple dates
-            location_node.children = create_date_subcategories(location_items, allocated_budget, location_node.category)
-            subcategories.append(location_node)
-    
-    # Recursive case 2: If single location, group by date
-    elif len(items) > 2:
-        # Group by date
-        dates = {}
-        for item in items:
-            date = item.date
-            if date not in dates:
-                dates[date] = []
-            dates[date].append(item)
-        
-        if len(dates) > 1:
-            for date, date_items in dates.items():
-                actual_cost = sum(item.cost for item in date_items)
-                allocated_budget = parent_budget * (len(date_items) / len(items))
-                
-                date_node = BudgetNode(
-                    name=f"Day {date}",
-                    allocated_budget=allocated_budget,
-                    actual_cost=actual_cost,
+        item_count = len(category_items)
+        if item_count > 1 and len(locations) > 1:
+            # Several locations: one child per location, subdivided by date when useful
+            for location, (location_items, dates) in locations.items():
+                # Proportionally allocate budget based on item count
+                location_budget = allocated_budget * (len(location_items) / item_count)
+                location_node = BudgetNode(
+                    name=f"{location}",
+                    allocated_budget=location_budget,
+                    actual_cost=location_costs[location],
                     children=[],
-                    items=date_items,
-                    category=f"{parent_category} - {date}"
+                    items=location_items,
+                    category=f"{category} - {location}"
+                )
+                if len(location_items) > 1 and len(dates) > 1:
+                    location_node.children = _date_nodes(
+                        dates, date_costs[location], location_budget, len(location_items), location_node.category
+                    )
+                category_node.children.append(location_node)
+        elif item_count > 2:
+            # Single location: its date groups are the category's date groups
+            ((location, (_, dates)),) = locations.items()
+            if len(dates) > 1:
+                category_node.children = _date_nodes(
+                    dates, date_costs[location], allocated_budget, item_count, category, "Day "
                 )
-                subcategories.append(date_node)
-    
-    return subcategories
-
-def create_date_subcategories(items: List[TimelineItem], parent_budget: float, parent_category: str) -> List[BudgetNode]:
-    """
-    Recursively creates date-based subcategories.
-    Base case: Single date or fewer than 2 items.
-    
-    Args:
-        items: List of timeline items to categorize by date
-        parent_budget: Budget allocated to parent category  
-        parent_category: Parent category name
-    
-    Returns:
-        List of BudgetNode children representing date subcategories
-    """
-    # Base case: Not enough items or all same date
-    if len(items) <= 1:
-        return []
-    
-    # Group by date
-    dates = {}
-    for item in items:
-        date = item.date
-        if date not in dates:
-            dates[date] = []
-        dates[date].append(item)
-    
-    # Base case: All items on same date
-    if len(dates) <= 1:
-        return []
-    
-    # Recursive case: Create date subcategories
-    subcategories = []
-    for date, date_items in dates.items():
-        actual_cost = sum(item.cost for item in date_items)
-        allocated_budget = parent_budget * (len(date_items) / len(items))
         
-        date_node = BudgetNode(
-            name=f"{date}",
-            allocated_budget=allocated_budget,
-            actual_cost=actual_cost,
-            children=[],
-            items=date_items,
-            category=f"{parent_category} - {date}"
-        )
-        subcategories.append(date_node)
+        root.children.append(category_node)
     
-    return subcategories
+    return root
 
 def recursive_budget_optimization(node: BudgetNode, optimization_factor: float = 0.1, depth: int = 0) -> Dict[str, Any]:
     """
@@ -317,14 +359,23 @@ def recursive_budget_optimization(node: BudgetNode, optimization_factor: float =
     # Recursive case: Analyze children and provide optimization suggestions
     suggestions = []
     child_analyses = []
+    # Reallocation candidates, collected in the same pass as (child, excess) and (child, slack)
+    over_budget_children = []
+    under_budget_children = []
     
     # Recursively analyze each child
     for child in node.children:
         child_analysis = recursive_budget_optimization(child, optimization_factor, depth + 1)
         child_analyses.append(child_analysis)
+        # The child's analysis already holds its utilization, so it is computed once per node
+        utilization = child_analysis["utilization_rate"]
+        if utilization > 100:
+            over_budget_children.append((child, child.actual_cost - child.allocated_budget))
+        elif utilization < 80:
+            under_budget_children.append((child, child.allocated_budget - child.actual_cost))
         
         # Generate optimization suggestions based on child analysis
-        if child.utilization_rate > 120:  # Over budget by 20%
+        if utilization > 120:  # Over budget by 20%
             excess = child.actual_cost - child.allocated_budget
             suggestions.append({
                 "type": "over_budget_warning",
@@ -333,7 +384,7 @@ def recursive_budget_optimization(node: BudgetNode, optimization_factor: float =
                 "severity": "high",
                 "recommended_action": f"Consider reducing costs in {child.name} or reallocating budget"
             })
-        elif child.utilization_rate < 50:  # Under-utilizing budget
+        elif utilization < 50:  # Under-utilizing budget
             unused = child.allocated_budget - child.actual_cost
             suggestions.append({
                 "type": "under_utilization",
@@ -343,28 +394,41 @@ def recursive_budget_optimization(node: BudgetNode, optimization_factor: float =
                 "recommended_action": f"Consider adding activities in {child.name} or reallocating to other categories"
             })
     
-    # Find reallocation opportunities between siblings
-    over_budget_children = [child for child in node.children if child.utilization_rate > 100]
-    under_budget_children = [child for child in node.children if child.utilization_rate < 80]
-    
-    if over_budget_children and under_budget_children:
-        for over_child in over_budget_children:
-            for under_child in under_budget_children:
-                potential_transfer = min(
-                    over_child.actual_cost - over_child.allocated_budget,
-                    under_child.allocated_budget - under_child.actual_cost
-                ) * optimization_factor
-                
-                if potential_transfer > 0:
-                    suggestions.append({
-                        "type": "reallocation_opportunity",
-                        "from_category": under_child.name,
-                        "to_category": over_child.name,
-                        "amount": potential_transfer,
-                        "message": f"Consider reallocating ${potential_transfer:.2f} from {under_child.name} to {over_child.name}",
-                        "severity": "low",
-                        "recommended_action": f"Transfer budget to optimize spending across categories"
-                    })
+    # Find reallocation opportunities between siblings: greedily match the largest excess
+    # with the largest slack, so each sibling appears in a bounded number of transfers
+    over_budget_children.sort(key=lambda pair: pair[1], reverse=True)
+    under_budget_children.sort(key=lambda pair: pair[1], reverse=True)
+    over_index = under_index = 0
+    remaining_excess = over_budget_children[0][1] if over_budget_children else 0
+    remaining_slack = under_budget_children[0][1] if under_budget_children else 0
+    while over_index < len(over_budget_children) and under_index < len(under_budget_children):
+        over_child = over_budget_children[over_index][0]
+        under_child = under_budget_children[under_index][0]
+        transfer = min(remaining_excess, remaining_slack)
+        potential_transfer = transfer * optimization_factor
+        
+        if potential_transfer > 0:
+            suggestions.append({
+                "type": "reallocation_opportunity",
+                "from_category": under_child.name,
+                "to_category": over_child.name,
+                "amount": potential_transfer,
+                "message": f"Consider reallocating ${potential_transfer:.2f} from {under_child.name} to {over_child.name}",
+                "severity": "low",
+                "recommended_action": f"Transfer budget to optimize spending across categories"
+            })
+        
+        # Advance past whichever side is used up (both when they match exactly)
+        remaining_excess -= transfer
+        remaining_slack -= transfer
+        if remaining_excess <= 0:
+            over_index += 1
+            if over_index < len(over_budget_children):
+                remaining_excess = over_budget_children[over_index][1]
+        if remaining_slack <= 0:
+            under_index += 1
+            if under_index < len(under_budget_children):
+                remaining_slack = under_budget_children[under_index][1]
     
     return {
         "node_name": node.name,
@@ -377,6 +441,43 @@ def recursive_budget_optimization(node: BudgetNode, optimization_factor: float =
         "total_suggestions": len(suggestions) + sum(len(child["suggestions"]) for child in child_analyses)
     }
 
+def calculate_tree_stats(node: BudgetNode) -> Dict[str, int]:
+    """Recursively calculates statistics for the budget tree"""
+    # Base case: Leaf node
+    if not node.children:
+        return {
+            "total_nodes": 1,
+            "leaf_nodes": 1, 
+            "max_depth": 0,
+            "over_budget_nodes": 1 if node.utilization_rate > 100 else 0
+        }
+    
+    # Recursive case: Aggregate children statistics
+    stats = {
+        "total_nodes": 1,
+        "leaf_nodes": 0,
+        "max_depth": 0,
+        "over_budget_nodes": 1 if node.utilization_rate > 100 else 0
+    }
+    
+    for child in node.children:
+        child_stats = calculate_tree_stats(child)
+        stats["total_nodes"] += child_stats["total_nodes"]
+        stats["leaf_nodes"] += child_stats["leaf_nodes"]
+        stats["max_depth"] = max(stats["max_depth"], child_stats["max_depth"] + 1)
+        stats["over_budget_nodes"] += child_stats["over_budget_nodes"]
+    
+    return stats
+
+# Keyed on the timeline's contents like create_timeline_chart, so regenerating an unchanged
+# timeline's tree is a lookup. The cached tree is shared by every rerun and session, which is
+# safe because it holds its own item lists (of frozen items) and nothing modifies it later.
+@st.cache_resource(show_spinner=False, max_entries=16)
+def build_budget_tree(timeline: BudgetTimeline) -> Tuple[BudgetNode, Dict[str, int]]:
+    """Build the budget tree and its statistics together, so reruns display stored stats"""
+    tree = create_hierarchical_budget_tree(timeline)
+    return tree, calculate_tree_stats(tree)
+
 def recursive_timeline_search(timeline_items: List[TimelineItem], search_criteria: Dict[str, Any], depth: int = 0) -> List[TimelineItem]:
     """
     Recursively searches timeline items based on nested criteria.
@@ -407,10 +508,13 @@ def recursive_timeline_search(timeline_items: List[TimelineItem], search_criteri
     filtered_items = timeline_items.copy()
     
     for criterion, value in current_criteria.items():
+        # Text criteria are lowered once here rather than once per item
         if criterion == "category":
-            filtered_items = [item for item in filtered_items if value.lower() in item.category.lower()]
+            needle = value.lower()
+            filtered_items = [item for item in filtered_items if needle in item.category.lower()]
         elif criterion == "location":
-            filtered_items = [item for item in filtered_items if value.lower() in item.location.lower()]
+            needle = value.lower()
+            filtered_items = [item for item in filtered_items if needle in item.location.lower()]
         elif criterion == "date_range":
             start_date, end_date = value
             filtered_items = [item for item in filtered_items if start_date <= item.date <= end_date]
@@ -425,20 +529,30 @@ def recursive_timeline_search(timeline_items: List[TimelineItem], search_criteri
     if not nested_criteria:
         return filtered_items
     
-    # Recursive case: Apply nested criteria
+    # Recursive case: Apply nested criteria. Results are combined by item id, which is
+    # cheaper than hashing whole items and keeps the timeline order.
     final_results = []
     for nested_key, nested_value in nested_criteria.items():
         if nested_key == "and":
             # Recursive AND operation
             recursive_results = recursive_timeline_search(filtered_items, nested_value, depth + 1)
-            final_results = recursive_results if not final_results else list(set(final_results) & set(recursive_results))
+            if final_results:
+                matching_ids = {item.id for item in recursive_results}
+                final_results = [item for item in final_results if item.id in matching_ids]
+            else:
+                final_results = list(recursive_results)
         elif nested_key == "or":
             # Recursive OR operation  
             recursive_results = recursive_timeline_search(timeline_items, nested_value, depth + 1)
             final_results.extend(recursive_results)
     
-    # Remove duplicates and return
-    return list(set(final_results)) if final_results else filtered_items
+    # Remove duplicates (first occurrence wins) and return
+    if not final_results:
+        return filtered_items
+    unique_items = {}
+    for item in final_results:
+        unique_items.setdefault(item.id, item)
+    return list(unique_items.values())
 
 # Initialize session state for timeline
 def init_session_state():
@@ -453,48 +567,59 @@ def init_session_state():
         st.session_state.ai_suggestions = []
     if 'budget_tree' not in st.session_state:
         st.session_state.budget_tree = None
+    if 'budget_tree_stats' not in st.session_state:
+        st.session_state.budget_tree_stats = None
     if 'optimization_results' not in st.session_state:
         st.session_state.optimization_results = None
+    if 'plan_history' not in st.session_state:
+        st.session_state.plan_history = []
+    if 'agent_scratchpad_debug' not in st.session_state:
+        st.session_state.agent_scratchpad_debug = deque(maxlen=AGENT_DEBUG_HISTORY_SIZE)
 
 # Define domain-specific sets for set operations demonstration
-def create_timeline_chart(timeline: BudgetTimeline) -> go.Figure:
+# Keyed on the timeline's contents, so reruns that don't change the timeline reuse the figure.
+# cache_resource rather than cache_data: unpickling a cached Figure re-validates every trace,
+# which costs as much as building it. Figures are never modified after creation.
+@st.cache_resource(show_spinner=False, max_entries=64)
+def create_timeline_chart(timeline: BudgetTimeline) -> "go.Figure":
     """Create an interactive timeline chart using Plotly"""
+    import plotly.graph_objects as go
+
     if not timeline.items:
         return go.Figure()
     
     # Sort items by date and time
-    sorted_items = sorted(timeline.items, key=lambda x: f"{x.date} {x.time}")
-    
-    fig = go.Figure()
+    sorted_items = sorted(timeline.items, key=ITEM_SORT_KEY)
     
     # Create datetime objects for proper plotting
-    datetimes = [datetime.strptime(f"{item.date} {item.time}", "%Y-%m-%d %H:%M") for item in sorted_items]
-    
-    # Add timeline items as scatter plot
-    for i, item in enumerate(sorted_items):
-        color = TIMELINE_CATEGORIES.get(item.category, "#95A5A6")
-        
-        fig.add_trace(go.Scatter(
-            x=[datetimes[i]],
-            y=[i],
-            mode='markers+text',
-            marker={
-                'size': 15 + (item.cost / max(it.cost for it in sorted_items) * 10) if sorted_items else 15,
-                'color': color,
-                'line': {'width': 2, 'color': 'white'}
-            },
-            text=f"{item.title}<br>${item.cost:.2f}",
-            textposition="middle right",
-            textfont={'size': 10},
-            name=item.category,
-            customdata=[item.id],
-            hovertemplate=f"<b>{item.title}</b><br>" +
-                         f"📅 {item.date} {item.time}<br>" +
-                         f"💰 ${item.cost:.2f}<br>" +
-                         f"📍 {item.location}<br>" +
-                         f"⏱️ {item.duration_hours}h<br>" +
-                         f"📝 {item.description}<extra></extra>"
-        ))
+    datetimes = [parse_item_datetime(item.date, item.time) for item in sorted_items]
+    max_cost = max(item.cost for item in sorted_items) or 1  # Avoid dividing by zero when everything is free
+    
+    # One trace with per-point arrays instead of one trace per item
+    fig = go.Figure(go.Scatter(
+        x=datetimes,
+        y=list(range(len(sorted_items))),
+        mode='markers+text',
+        marker={
+            'size': [15 + (item.cost / max_cost * 10) for item in sorted_items],
+            'color': [TIMELINE_CATEGORIES.get(item.category, "#95A5A6") for item in sorted_items],
+            'line': {'width': 2, 'color': 'white'}
+        },
+        text=[f"{item.title}<br>${item.cost:.2f}" for item in sorted_items],
+        textposition="middle right",
+        textfont={'size': 10},
+        customdata=[item.id for item in sorted_items],
+        hovertext=[
+            f"<b>{item.title}</b><br>"
+            f"📅 {item.date} {item.time}<br>"
+            f"💰 ${item.cost:.2f}<br>"
+            f"📍 {item.location}<br>"
+            f"⏱️ {item.duration_hours}h<br>"
+            f"📝 {item.description}"
+            for item in sorted_items
+        ],
+        hovertemplate="%{hovertext}<extra></extra>"
+    ))
     
     # Customize layout
     fig.update_layout(
@@ -534,7 +659,10 @@ def render_timeline_item_card(item: TimelineItem):
         with col3:
             # Cost and category
             st.metric("Cost", f"${item.cost:.2f}")
-            st.text(f"🏷️ {item.category.split(' ')[1] if ' ' in item.category else item.category}")
+            label = CATEGORY_LABEL.get(item.category)
+            if label is None:  # Categories the AI made up aren't in the table
+                label = item.category.split(' ')[1] if ' ' in item.category else item.category
+            st.text(f"🏷️ {label}")
         
         with col4:
             # Action buttons
@@ -545,7 +673,7 @@ def render_timeline_item_card(item: TimelineItem):
             
             if st.button("🗑️", key=f"delete_{item.id}", help="Delete item"):
                 if st.session_state.timeline:
-                    st.session_state.timeline.items = [i for i in st.session_state.timeline.items if i.id != item.id]
+                    st.session_state.timeline.remove_item(item.id)
                 st.rerun()
 
 def render_timeline_editor():
@@ -582,7 +710,7 @@ def render_timeline_editor():
     
     if timeline.items:
         # Sort items by date and time
-        sorted_items = sorted(timeline.items, key=lambda x: f"{x.date} {x.time}")
+        sorted_items = sorted(timeline.items, key=ITEM_SORT_KEY)
         
         for i, item in enumerate(sorted_items):
             with st.expander(f"{item.title} - {item.date} {item.time} - ${item.cost:.2f}"):
@@ -599,14 +727,14 @@ def render_item_editor_form(item: Optional[TimelineItem] = None):
         description = st.text_area("Description", value=item.description if item else "", height=100)
         location = st.text_input("Location", value=item.location if item else "")
         category = st.selectbox("Category", 
-                              options=list(TIMELINE_CATEGORIES.keys()),
-                              index=list(TIMELINE_CATEGORIES.keys()).index(item.category) if item and item.category in TIMELINE_CATEGORIES else 0)
+                              options=TIMELINE_CATEGORY_KEYS,
+                              index=TIMELINE_CATEGORY_INDEX.get(item.category, 0) if item else 0)
     
     with col2:
         date = st.date_input("Date", 
-                           value=datetime.strptime(item.date, "%Y-%m-%d").date() if item else datetime.now().date())
+                           value=parse_item_datetime(item.date, item.time).date() if item else datetime.now().date())
         time = st.time_input("Time", 
-                           value=datetime.strptime(item.time, "%H:%M").time() if item else datetime.now().time())
+                           value=parse_item_datetime(item.date, item.time).time() if item else datetime.now().time())
         cost = st.number_input("Cost", min_value=0.0, value=item.cost if item else 0.0, step=1.0)
         duration = st.number_input("Duration (hours)", min_value=0.1, value=item.duration_hours if item else 1.0, step=0.5)
     
@@ -646,7 +774,7 @@ def render_item_editor(item: Optional[TimelineItem] = None):
             if st.form_submit_button("💾 Save", type="primary"):
                 # Create or update item
                 new_item = TimelineItem(
-                    id=item.id if item else f"item_{datetime.now().timestamp()}",
+                    id=item.id if item else f"item_{uuid4().hex}",
                     title=form_data['title'],
                     description=form_data['description'],
                     date=form_data['date'].strftime("%Y-%m-%d"),
@@ -662,13 +790,10 @@ def render_item_editor(item: Optional[TimelineItem] = None):
                 
                 if item:  # Update existing
                     if st.session_state.timeline:
-                        st.session_state.timeline.items = [
-                            new_item if i.id == item.id else i 
-                            for i in st.session_state.timeline.items
-                        ]
+                        st.session_state.timeline.update_item(new_item)
                 else:  # Add new
                     if st.session_state.timeline:
-                        st.session_state.timeline.items.append(new_item)
+                        st.session_state.timeline.add_item(new_item)
                 
                 st.session_state.edit_mode = False
                 st.session_state.selected_item_id = None
@@ -684,66 +809,59 @@ def render_item_editor(item: Optional[TimelineItem] = None):
         with col3:
             if item and st.form_submit_button("🗑️ Delete", type="secondary"):
                 if st.session_state.timeline:
-                    st.session_state.timeline.items = [i for i in st.session_state.timeline.items if i.id != item.id]
+                    st.session_state.timeline.remove_item(item.id)
                 st.session_state.edit_mode = False
                 st.session_state.selected_item_id = None
                 st.success("Item deleted!")
                 st.rerun()
 
+# Destination categories for the set operations demo, built once at import
+DESTINATIONS_DATA = {
+    "Paris": ("popular", "budget"),
+    "Tokyo": ("popular", "adventure"),
+    "New York": ("popular", "budget"),
+    "Bangkok": ("popular", "budget", "adventure"),
+    "London": ("popular",),
+    "Sydney": ("popular",),
+    "Rome": ("popular",),
+    "Barcelona": ("popular",),
+    "Budapest": ("budget",),
+    "Prague": ("budget",),
+    "Mexico City": ("budget",),
+    "Warsaw": ("budget",),
+    "Lisbon": ("budget",),
+    "Athens": ("budget",),
+    "Nepal": ("adventure",),
+    "New Zealand": ("adventure",),
+    "Costa Rica": ("adventure",),
+    "Iceland": ("adventure",),
+    "Peru": ("adventure",),
+    "Patagonia": ("adventure",)
+}
+
+# Using set comprehensions to build one immutable set per category
+POPULAR_DESTINATIONS, BUDGET_DESTINATIONS, ADVENTURE_DESTINATIONS = (
+    frozenset(destination for destination, categories in DESTINATIONS_DATA.items() if category in categories)
+    for category in ("popular", "budget", "adventure")
+)
+
 def get_domain_sets():
-    """Returns three sets related to budget planning domain using advanced comprehensions"""
-    
-    # Base destination data with categories
-    destinations_data = {
-        "Paris": ["popular", "budget"],
-        "Tokyo": ["popular", "adventure"],
-        "New York": ["popular", "budget"],
-        "Bangkok": ["popular", "budget", "adventure"],
-        "London": ["popular"],
-        "Sydney": ["popular"],
-        "Rome": ["popular"],
-        "Barcelona": ["popular"],
-        "Budapest": ["budget"],
-        "Prague": ["budget"],
-        "Mexico City": ["budget"],
-        "Warsaw": ["budget"],
-        "Lisbon": ["budget"],
-        "Athens": ["budget"],
-        "Nepal": ["adventure"],
-        "New Zealand": ["adventure"],
-        "Costa Rica": ["adventure"],
-        "Iceland": ["adventure"],
-        "Peru": ["adventure"],
-        "Patagonia": ["adventure"]
-    }
-    
-    # Using dictionary comprehension and set comprehension to create category sets
-    category_sets = {
-        category: {destination for destination, categories in destinations_data.items() 
-                  if category in categories}
-        for category in ["popular", "budget", "adventure"]
-    }
-    
-    # Return the sets using tuple unpacking from dictionary comprehension
-    return category_sets["popular"], category_sets["budget"], category_sets["adventure"]
-
-def perform_set_operations(set_a, set_b, set_c):
-    """Performs all required set operations and returns results"""
-    # Using dictionary comprehension to create results with operation mappings
-    operations = {
-        'union': lambda: set_a.union(set_b).union(set_c),
-        'intersection': lambda: set_a.intersection(set_b).intersection(set_c),
-        'difference_a_b': lambda: set_a.difference(set_b),
-        'difference_c_a': lambda: set_c.difference(set_a),
-        'symmetric_diff_a_b': lambda: set_a.symmetric_difference(set_b),
-        'is_subset_b_a': lambda: set_b.issubset(set_a),
-        'is_superset_a_c': lambda: set_a.issuperset(set_c)
+    """Returns three sets related to budget planning domain: popular, budget and adventure destinations"""
+    return POPULAR_DESTINATIONS, BUDGET_DESTINATIONS, ADVENTURE_DESTINATIONS
+
+# Cached per distinct input, so repeated clicks reuse the results; inputs must be frozensets
+@lru_cache(maxsize=32)
+def perform_set_operations(set_a: frozenset, set_b: frozenset, set_c: frozenset) -> Dict[str, Any]:
+    """Performs all required set operations and returns results (shared, so don't modify them)"""
+    return {
+        'union': set_a.union(set_b, set_c),
+        'intersection': set_a.intersection(set_b, set_c),
+        'difference_a_b': set_a.difference(set_b),
+        'difference_c_a': set_c.difference(set_a),
+        'symmetric_diff_a_b': set_a.symmetric_difference(set_b),
+        'is_subset_b_a': set_b.issubset(set_a),
+        'is_superset_a_c': set_a.issuperset(set_c)
     }
-    
-    # Dictionary comprehension to execute all operations
-    results = {key: operation() for key, operation in operations.items()}
-    
-    return results
 
 
 
@@ -757,6 +875,7 @@ st.title("� AI Budget Timeline Planner")
 st.caption("Create interactive timeline-based budget plans with AI assistance. Add, edit, and optimize your activities with real-time budget tracking.")
 
 # --- API Key Management ---
+GOOGLE_MAPS_API_KEY = None
 try:
     if hasattr(st, 'secrets') and "GOOGLE_API_KEY" in st.secrets:
         GOOGLE_API_KEY = st.secrets["GOOGLE_API_KEY"]
@@ -826,121 +945,174 @@ if st.session_state.show_debug:
     
     # Clear debug history button
     if st.sidebar.button("🗑️ Clear Debug History"):
-        st.session_state.agent_scratchpad_debug = []
+        st.session_state.agent_scratchpad_debug.clear()
         st.sidebar.success("Debug history cleared!")
 
 # --- Langchain Setup ---
-llm = None
-budget_agent_executor = None 
-
-if GOOGLE_API_KEY:
-    try:
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            google_api_key=GOOGLE_API_KEY,
-            temperature=0.5,
-            convert_system_message_to_human=True
-        )
+@st.cache_resource
+def enable_llm_cache() -> "SQLiteCache":
+    """Serve identical Gemini prompts from a local SQLite cache; set up once per process."""
+    from langchain_community.cache import SQLiteCache
+    from langchain_core.globals import set_llm_cache
+
+    cache = SQLiteCache(database_path=".aibp_llm_cache.sqlite")
+    set_llm_cache(cache)
+    return cache
+
+@st.cache_resource
+def get_agent_prompt() -> "ChatPromptTemplate":
+    """Parse the agent prompt template once per process; the tool list is filled in per agent."""
+    from langchain_core.prompts import ChatPromptTemplate
+
+    return ChatPromptTemplate.from_messages([
+        ("system", """You are a practical AI budget planner that builds timeline-based budget plans.
+Available tools: {available_tools}.
+
+1. Call the matching tool for EACH requested activity and use its real results; never invent places or prices.
+   Searches don't depend on each other, so request all of them together in your first reply.
+2. Schedule items chronologically with realistic dates, times, durations and costs.
+3. Total the costs against the budget and suggest savings if it is exceeded.
+
+Reply with ONLY a JSON object of this shape:
+{{"timeline_items": [{{"title": "Activity Name", "description": "Brief description", "date": "YYYY-MM-DD", "time": "HH:MM", "cost": 50.00, "category": "🍽️ Food & Dining", "location": "Specific location", "duration_hours": 2.0, "booking_required": true, "booking_url": "https://...", "ai_suggested": true, "notes": "Additional notes"}}],
+ "budget_analysis": {{"total_cost": 150.00, "remaining_budget": 50.00, "feasibility": "Within budget", "recommendations": ["Tip 1", "Tip 2"]}},
+ "ai_suggestions": [{{"type": "cost_optimization", "suggestion": "Consider lunch instead of dinner to save $20", "potential_savings": 20.00}}]}}
+
+Categories: 🍽️ Food & Dining, ✈️ Transportation, 🏨 Accommodation, 🎭 Entertainment, 🛍️ Shopping, 🎯 Activities, 📱 Services, 💼 Business, 🏥 Health, 📚 Education, 🎨 Culture, 🌿 Nature"""),
+        ("human", """Budget: {currency}{budget}
+Location: {location}
+Activities: {activities}"""),
+        ("placeholder", "{agent_scratchpad}")
+    ])
 
-        # Initialize tools using list comprehension for conditional tool addition
-        tools = [FlightSearchTool()]  # Always include flight search tool
-        
-        # Add Google Maps tool only if API key is available using conditional list comprehension
-        tools.extend([GoogleMapSearchTool(api_key=GOOGLE_MAPS_API_KEY)] if GOOGLE_MAPS_API_KEY else [])
+@st.cache_resource
+def get_suggestion_chain(google_api_key: str) -> "Runnable":
+    """Tool-free Gemini call for AI suggestions, with its own short prompt and JSON-only replies.
 
-        
-        # Agent prompt template with dynamic tool availability
-        available_tools_info = "FlightSearch (for flight bookings)"
-        if GOOGLE_MAPS_API_KEY:
-            available_tools_info += " and GoogleMapSearch (for local places)"
-        
-        agent_prompt = ChatPromptTemplate.from_messages([
-            ("system", f"""You are a friendly, insightful, and practical AI budget planner that creates structured timeline-based budget plans.
-            You have access to these tools: {available_tools_info}.
-            
-            IMPORTANT: You MUST return a JSON structure for timeline-based budget planning, not just text!
-            
-            The user has a total budget of {{currency}}{{budget}}.
-            The user is located in {{location}} (if provided).
-            The user wants to engage in the following activities: {{activities}}.
-
-            RESPONSE FORMAT:
-            You must return a JSON object with this exact structure:
-            {{{{
-                "timeline_items": [
-                    {{{{
-                        "title": "Activity Name",
-                        "description": "Brief description",
-                        "date": "YYYY-MM-DD",
-                        "time": "HH:MM",
-                        "cost": 50.00,
-                        "category": "🍽️ Food & Dining",
-                        "location": "Specific location",
-                        "duration_hours": 2.0,
-                        "booking_required": true,
-                        "booking_url": "https://...",
-                        "ai_suggested": true,
-                        "notes": "Additional notes"
-                    }}}}
-                ],
-                "budget_analysis": {{{{
-                    "total_cost": 150.00,
-                    "remaining_budget": 50.00,
-                    "feasibility": "Within budget",
-                    "recommendations": ["Tip 1", "Tip 2"]
-                }}}},
-                "ai_suggestions": [
-                    {{{{
-                        "type": "cost_optimization",
-                        "suggestion": "Consider lunch instead of dinner to save $20",
-                        "potential_savings": 20.00
-                    }}}}
-                ]
-            }}}}
-
-            CATEGORIES TO USE:
-            🍽️ Food & Dining, ✈️ Transportation, 🏨 Accommodation, 🎭 Entertainment, 
-            🛍️ Shopping, 🎯 Activities, 📱 Services, 💼 Business, 🏥 Health, 
-            📚 Education, 🎨 Culture, 🌿 Nature
-
-            STEP-BY-STEP PROCESS:
-            1. For EACH activity mentioned by the user, call the appropriate tool to get real data
-            2. Create timeline items with realistic dates, times, and costs
-            3. Ensure activities are scheduled logically (chronological order, realistic timing)
-            4. Calculate total costs and provide budget analysis
-            5. Suggest optimizations if over budget
-            
-            Remember: ALWAYS use the available tools for real data, then format as JSON!"""),
-            ("human", """Create a detailed timeline-based budget plan for:
+    Suggestions need neither the tools nor the timeline schema that the planning agent sends with every request.
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    enable_llm_cache()
+    llm = ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        google_api_key=google_api_key,
+        temperature=0.5,
+        response_mime_type="application/json"
+    )
+    return ChatPromptTemplate.from_messages([
+        ("system", """You review budget timelines and give specific, actionable optimization suggestions.
+Reply with a JSON object of this shape:
+{{"suggestions": [{{"type": "cost_optimization|budget_reallocation|activity_suggestion|time_optimization", "suggestion": "Specific actionable suggestion", "potential_savings": 25.50, "affected_items": ["item_title1"], "priority": "high|medium|low"}}],
+ "budget_analysis": {{"status": "over_budget|within_budget|under_budget", "recommendations": ["recommendation1"]}}}}"""),
+        ("human", "{timeline}")
+    ]) | llm
+
+def warm_up_connections(llm, warm_maps: bool) -> None:
+    """Pay the Gemini and Maps connection setup in the background while the user fills in the form."""
+    def warm_up():
+        try:
+            # Bypass the LLM cache, otherwise a cached "ping" never touches the network
+            llm.model_copy(update={"cache": False}).invoke("ping")
+        except Exception as e:
+            logger.debug("Gemini warm-up failed: %s", e)
+        if warm_maps:
+            from Tools.google_map_search import preconnect
+            preconnect()
+    threading.Thread(target=warm_up, daemon=True).start()
+
+# Cheap pre-routing of activities to tools, so the LLM only sees the schemas it needs
+IATA_CODE_PATTERN = re.compile(r"\b[A-Z]{3}\b")
+# Origin/destination pair such as "LAX to JFK", "LAX-JFK" or "LAX → JFK"
+IATA_ROUTE_PATTERN = re.compile(r"\b[A-Z]{3}\s*(?:to|-|–|→|->|/)\s*[A-Z]{3}\b")
+ISO_DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+FLIGHT_WORD_PATTERN = re.compile(r"\b(?:fly|flying|flights?|airports?|airfare|plane)\b", re.IGNORECASE)
+TOOL_DESCRIPTIONS = {
+    "FlightSearch": "FlightSearch (for flight bookings)",
+    "GoogleMapSearch": "GoogleMapSearch (for local places)",
+}
 
-Budget: {currency}{budget}
-Location: {location}
-Activities: {activities}
+def preclassify(activity: str) -> set:
+    """Guess which tools an activity needs.
 
-IMPORTANT: 
-1. Use the appropriate tools to find real information for each activity
-2. Return the response as a structured JSON format for timeline creation
-3. Include realistic dates, times, and locations
-4. Provide cost breakdowns and budget analysis
-5. Suggest optimizations if needed
+    Flight words or an airport code pair mean FlightSearch alone. A lone code or a date might
+    be a flight or just a place and day ("dinner in NYC on 2025-08-16"), so both tools are kept.
+    """
+    if FLIGHT_WORD_PATTERN.search(activity) or IATA_ROUTE_PATTERN.search(activity):
+        return {"FlightSearch"}
+    if IATA_CODE_PATTERN.search(activity) or ISO_DATE_PATTERN.search(activity):
+        return {"FlightSearch", "GoogleMapSearch"}
+    return {"GoogleMapSearch"}
+
+def select_tools(activities: str) -> Tuple[str, ...]:
+    """Union of preclassify over the comma-separated activities, as a hashable cache key."""
+    names = set()
+    for activity in activities.split(","):
+        if activity.strip():
+            names |= preclassify(activity)
+    return tuple(sorted(names))
+
+@st.cache_resource(show_spinner=False)
+def get_budget_agent(google_api_key: str, google_maps_api_key: Optional[str] = None,
+                     tool_names: Optional[Tuple[str, ...]] = None) -> "AgentExecutor":
+    """Build the budget planning agent once per API key pair and tool subset instead of on every rerun.
+
+    tool_names limits the agent to those tools; if none of them are available, all tools are kept.
+    """
+    from langchain.agents import AgentExecutor, create_tool_calling_agent
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from Tools.flight_search import FlightSearchTool
+    from Tools.google_map_search import GoogleMapSearchTool
+
+    enable_llm_cache()
+    llm = ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        google_api_key=google_api_key,
+        temperature=0.5,
+        convert_system_message_to_human=True
+    )
+    # Only the full-tool agent is built at startup; per-request subsets reuse the warm connections
+    if not tool_names:
+        warm_up_connections(llm, bool(google_maps_api_key))
+
+    # Initialize tools using list comprehension for conditional tool addition
+    tools = [FlightSearchTool()]  # Always include flight search tool
+    
+    # Add Google Maps tool only if API key is available using conditional list comprehension
+    tools.extend([GoogleMapSearchTool(api_key=google_maps_api_key)] if google_maps_api_key else [])
+    if tool_names:
+        tools = [tool for tool in tools if tool.name in tool_names] or tools
+
+    # Agent prompt template with dynamic tool availability
+    available_tools_info = " and ".join(TOOL_DESCRIPTIONS[tool.name] for tool in tools)
+    
+    agent_prompt = get_agent_prompt().partial(available_tools=available_tools_info)
+
+    # Create the agent
+    agent = create_tool_calling_agent(llm, tools, agent_prompt)
+    
+    # Create the agent executor with more debugging
+    return AgentExecutor(
+        agent=agent, 
+        tools=tools, 
+        verbose=True,  # Enable verbose mode to see tool calls
+        # A plan needs one flight search plus a few place searches, and tool calls from
+        # the same turn run together, so a handful of turns is plenty
+        max_iterations=6,
+        max_execution_time=60,  # seconds; bounds the worst case if the model keeps looping
+        # run_budget_agent collects steps from the stream as they happen, so the final
+        # chunk doesn't need to repeat them
+        return_intermediate_steps=False,
+        handle_parsing_errors=True,
+        early_stopping_method="force"  # Tool-calling agents only support "force"
+    )
 
-Generate a comprehensive timeline-based budget plan in JSON format."""),
-            ("placeholder", "{agent_scratchpad}")
-        ])
+budget_agent_executor = None 
 
-        # Create the agent
-        agent = create_tool_calling_agent(llm, tools, agent_prompt)
-        
-        # Create the agent executor with more debugging
-        budget_agent_executor = AgentExecutor(
-            agent=agent, 
-            tools=tools, 
-            verbose=True,  # Enable verbose mode to see tool calls
-            max_iterations=20,
-            return_intermediate_steps=True,  # Enable to capture scratchpad data
-            handle_parsing_errors=True,
-            early_stopping_method="generate"  # Ensures complete response generation
-        )
+if GOOGLE_API_KEY:
+    try:
+        budget_agent_executor = get_budget_agent(GOOGLE_API_KEY, GOOGLE_MAPS_API_KEY or None)
 
     except Exception as e:
         st.sidebar.error(f"Error initializing AI model: {e}")
@@ -950,65 +1122,171 @@ else:
     st.sidebar.warning("Please enter your Google API Key in the sidebar to enable the AI planner.")
     st.sidebar.info("💡 The flight search tool will work with just the Google API Key. Google Maps API is optional for local place searches.")
 
-def parse_ai_response_to_timeline(ai_response: str, budget: float, currency: str, location: str) -> BudgetTimeline:
-    """Parse AI response and create a BudgetTimeline object"""
+def plan_cache_key(executor: "AgentExecutor", budget: float, currency: str, location: str, activities: str) -> str:
+    """Hash the plan inputs, normalized for case and whitespace, with the agent's tool set."""
+    payload = {
+        "b": round(budget, 2),
+        "c": currency,
+        "l": location.strip().lower(),
+        "a": " ".join(activities.lower().split()),
+        "t": sorted(tool.name for tool in executor.tools),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+@st.cache_resource
+def plan_response_cache() -> Tuple[TTLCache, threading.Lock]:
+    """Process-wide store of agent responses by plan_cache_key, shared across sessions."""
+    return TTLCache(maxsize=128, ttl=3600), threading.Lock()
+
+@st.cache_resource
+def agent_event_loop() -> asyncio.AbstractEventLoop:
+    """One long-lived event loop, on a daemon thread, that every agent run is scheduled on.
+
+    The cached agent's Gemini client creates its grpc.aio channel on first async use and the
+    channel stays bound to that loop, so a fresh asyncio.run per plan would reuse a dead client.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="agent-event-loop", daemon=True).start()
+    return loop
+
+def run_budget_agent(plan_key: str, executor: "AgentExecutor", inputs: Dict[str, Any],
+                     on_step: Optional[Callable[[Any], None]] = None, refresh: bool = False) -> Dict[str, Any]:
+    """Stream the agent run, calling on_step for each tool call as it finishes.
+
+    A repeated plan_key within the hour returns the stored response without calling the agent,
+    unless refresh is set, in which case the agent runs again and replaces the stored response.
+    """
+    cache, lock = plan_response_cache()
+    if not refresh:
+        with lock:
+            cached = cache.get(plan_key)
+        if cached is not None:
+            return cached
+
+    # on_step updates Streamlit elements, which only works on the script thread, so steps
+    # are handed back through a queue while the run itself happens on the agent loop
+    step_queue: "queue.Queue[Tuple[Any, Any]]" = queue.Queue()
+
+    async def collect() -> Dict[str, Any]:
+        # The async executor runs all tool calls from one LLM turn concurrently
+        # (asyncio.gather), so a flight search and several place searches overlap
+        steps = []
+        output = ""
+        async for chunk in executor.astream(inputs):
+            for step in chunk.get("steps", []):
+                steps.append((step.action, step.observation))
+                step_queue.put((step.action, step.observation))
+            if "output" in chunk:
+                output = chunk["output"]
+        return {"output": output, "intermediate_steps": steps}
+
+    future = asyncio.run_coroutine_threadsafe(collect(), agent_event_loop())
     try:
-        # Try to extract JSON from the response
-        import re
-        json_match = re.search(r'\{.*\}', ai_response, re.DOTALL)
-        if json_match:
-            response_data = json.loads(json_match.group())
+        while True:
+            try:
+                step = step_queue.get(timeout=0.1)
+            except queue.Empty:
+                if future.done():
+                    break
+                continue
+            if on_step:
+                on_step(step)
+        response = future.result()
+    except BaseException:
+        # A rerun or stop interrupts the script thread; don't leave the run going on the loop
+        future.cancel()
+        raise
+    output = response["output"]
+    if output:
+        with lock:
+            cache[plan_key] = response
+    return response
+
+_JSON_DECODER = json.JSONDecoder()
+# Outermost {...} span of the suggestions reply, compiled once rather than per click
+JSON_BLOCK_PATTERN = re.compile(r"\{.*\}", re.DOTALL)
+
+def extract_plan_json(text: str) -> Optional[Dict[str, Any]]:
+    """Return the first JSON object in text that has timeline_items, or None.
+
+    raw_decode stops at the end of one object, so prose, code fences or stray braces
+    around the plan don't break parsing the way a greedy {.*} match does.
+    """
+    start = text.find("{")
+    while start != -1:
+        try:
+            candidate, _ = _JSON_DECODER.raw_decode(text, start)
+        except json.JSONDecodeError:
+            pass
         else:
-            # Fallback: create a simple timeline from text
-            return create_fallback_timeline(ai_response, budget, currency, location)
-        
-        # Create timeline items from AI response
-        timeline_items = []
-        for item_data in response_data.get('timeline_items', []):
-            timeline_item = TimelineItem(
-                id=f"ai_item_{datetime.now().timestamp()}_{len(timeline_items)}",
-                title=item_data.get('title', 'Untitled Activity'),
-                description=item_data.get('description', ''),
-                date=item_data.get('date', datetime.now().strftime('%Y-%m-%d')),
-                time=item_data.get('time', '09:00'),
-                cost=float(item_data.get('cost', 0)),
-                category=item_data.get('category', '🎯 Activities'),
-                location=item_data.get('location', location),
-                duration_hours=float(item_data.get('duration_hours', 1.0)),
-                booking_required=item_data.get('booking_required', False),
-                booking_url=item_data.get('booking_url', ''),
-                ai_suggested=True,
-                notes=item_data.get('notes', '')
-            )
-            timeline_items.append(timeline_item)
-        
-        # Create the timeline
-        timeline = BudgetTimeline(
-            items=timeline_items,
-            total_budget=budget,
-            currency=currency,
-            start_date=min(item.date for item in timeline_items) if timeline_items else datetime.now().strftime('%Y-%m-%d'),
-            end_date=max(item.date for item in timeline_items) if timeline_items else datetime.now().strftime('%Y-%m-%d'),
-            location=location
-        )
-        
-        # Store AI suggestions in session state
-        if 'ai_suggestions' in response_data:
-            st.session_state.ai_suggestions = response_data['ai_suggestions']
-        
-        return timeline
-        
-    except json.JSONDecodeError as e:
-        st.warning(f"Could not parse AI response as JSON. Creating fallback timeline. Error: {e}")
+            if isinstance(candidate, dict) and "timeline_items" in candidate:
+                return candidate
+        start = text.find("{", start + 1)
+    return None
+
+def parse_ai_response_to_timeline(ai_response: str, budget: float, currency: str, location: str) -> BudgetTimeline:
+    """Parse AI response and create a BudgetTimeline object"""
+    response_data = extract_plan_json(ai_response)
+    if response_data is None:
+        if "{" in ai_response:
+            st.warning("Could not parse AI response as a JSON timeline. Creating fallback timeline.")
+        # Fallback: create a simple timeline from text
         return create_fallback_timeline(ai_response, budget, currency, location)
 
+    # Create timeline items from AI response, tracking the date range in the same pass
+    timeline_items = []
+    start_date = end_date = None
+    today = datetime.now().strftime('%Y-%m-%d')
+    for item_data in response_data.get('timeline_items', []):
+        timeline_item = TimelineItem(
+            id=f"ai_item_{uuid4().hex}",
+            title=item_data.get('title', 'Untitled Activity'),
+            description=item_data.get('description', ''),
+            date=item_data.get('date', today),
+            time=item_data.get('time', '09:00'),
+            cost=float(item_data.get('cost', 0)),
+            category=item_data.get('category', '🎯 Activities'),
+            location=item_data.get('location', location),
+            duration_hours=float(item_data.get('duration_hours', 1.0)),
+            booking_required=item_data.get('booking_required', False),
+            booking_url=item_data.get('booking_url', ''),
+            ai_suggested=True,
+            notes=item_data.get('notes', '')
+        )
+        timeline_items.append(timeline_item)
+        item_date = timeline_item.date
+        if start_date is None:
+            start_date = end_date = item_date
+        elif item_date < start_date:
+            start_date = item_date
+        elif item_date > end_date:
+            end_date = item_date
+    if start_date is None:
+        start_date = end_date = today
+    
+    # Create the timeline
+    timeline = BudgetTimeline(
+        items=timeline_items,
+        total_budget=budget,
+        currency=currency,
+        start_date=start_date,
+        end_date=end_date,
+        location=location
+    )
+    
+    # Store AI suggestions in session state
+    if 'ai_suggestions' in response_data:
+        st.session_state.ai_suggestions = response_data['ai_suggestions']
+    
+    return timeline
+
 def create_fallback_timeline(ai_response: str, budget: float, currency: str, location: str) -> BudgetTimeline:
     """Create a basic timeline when AI response parsing fails"""
     # Create a simple timeline item from the AI response
     timeline_item = TimelineItem(
-        id=f"fallback_{datetime.now().timestamp()}",
+        id=f"fallback_{uuid4().hex}",
         title="AI Generated Plan",
-        description=ai_response[:200] + "..." if len(ai_response) > 200 else ai_response,
+        description=truncate_text(ai_response, 200),
         date=datetime.now().strftime('%Y-%m-%d'),
         time='09:00',
         cost=budget * 0.8,  # Use 80% of budget as estimate
@@ -1030,6 +1308,31 @@ def create_fallback_timeline(ai_response: str, budget: float, currency: str, loc
         location=location
     )
 
+def record_agent_debug(kind: str, input_text: str, response: Any) -> None:
+    """Keep the agent response for the debug panel, only while debug mode is on"""
+    if not st.session_state.get('show_debug', False):
+        return
+    
+    is_dict = isinstance(response, dict)
+    steps = response.get('intermediate_steps', []) if is_dict else []
+    st.session_state.agent_scratchpad_debug.append({
+        'timestamp': datetime.now().isoformat(),
+        'type': kind,
+        'input': input_text,
+        'output': response.get("output", str(response)) if is_dict else str(response),
+        # Formatted now, so the entry doesn't hold on to tool outputs and message logs
+        'intermediate_steps': [format_agent_step(step) for step in steps],
+        'raw_response_keys': list(response.keys()) if is_dict else 'not_dict',
+        'has_intermediate_steps': is_dict and 'intermediate_steps' in response,
+        'num_intermediate_steps': len(steps)
+    })
+    st.write(f"🐛 **Debug Info:** Found {len(steps)} intermediate steps")
+
+def truncate_text(value: Any, limit: int = 300) -> str:
+    """Stringify value once and cut it to limit characters, marking the cut with '...'"""
+    text = value if isinstance(value, str) else str(value)
+    return text if len(text) <= limit else text[:limit] + "..."
+
 def format_agent_step(step):
     """Format an agent intermediate step for display"""
     if isinstance(step, tuple) and len(step) == 2:
@@ -1042,11 +1345,11 @@ def format_agent_step(step):
             action_text = str(action)
             
         # Format the observation
-        observation_text = str(observation)[:300] + "..." if len(str(observation)) > 300 else str(observation)
+        observation_text = truncate_text(observation)
         
         return f"**Action:**\n{action_text}\n\n**Observation:**\n{observation_text}"
     else:
-        return str(step)[:300] + "..." if len(str(step)) > 300 else str(step)
+        return truncate_text(step)
 
 def render_ai_suggestions():
     """Render AI suggestions panel"""
@@ -1070,21 +1373,22 @@ def render_ai_suggestions():
                 for rec in recommendations:
                     st.write(f"• {rec}")
         
-        # Organize suggestions by priority
-        high_priority = [s for s in st.session_state.ai_suggestions if s.get('priority') == 'high']
-        medium_priority = [s for s in st.session_state.ai_suggestions if s.get('priority') == 'medium']
-        low_priority = [s for s in st.session_state.ai_suggestions if s.get('priority') == 'low']
+        # Organize suggestions by priority in one pass, keeping each one's position for Dismiss.
+        # Missing or unknown priorities (the plan prompt's suggestions carry none) count as low.
+        priority_groups = {'high': [], 'medium': [], 'low': []}
+        for index, suggestion in enumerate(st.session_state.ai_suggestions):
+            priority_groups.get(suggestion.get('priority'), priority_groups['low']).append((index, suggestion))
         
         # Display suggestions by priority
         for priority_group, priority_name, color in [
-            (high_priority, "High Priority", "🔴"),
-            (medium_priority, "Medium Priority", "🟡"), 
-            (low_priority, "Low Priority", "🟢")
+            (priority_groups['high'], "High Priority", "🔴"),
+            (priority_groups['medium'], "Medium Priority", "🟡"), 
+            (priority_groups['low'], "Low Priority", "🟢")
         ]:
             if priority_group:
                 st.write(f"**{color} {priority_name} Suggestions:**")
                 
-                for i, suggestion in enumerate(priority_group):
+                for i, (index, suggestion) in enumerate(priority_group):
                     suggestion_type = suggestion.get('type', 'suggestion').replace('_', ' ').title()
                     
                     with st.expander(f"💡 {suggestion_type}"):
@@ -1108,8 +1412,8 @@ def render_ai_suggestions():
                         
                         with col2:
                             if st.button("❌ Dismiss", key=f"dismiss_suggestion_{priority_name}_{i}"):
-                                # Remove this suggestion
-                                st.session_state.ai_suggestions.remove(suggestion)
+                                # Remove this suggestion by position; remove() would scan and compare dicts
+                                del st.session_state.ai_suggestions[index]
                                 st.rerun()
     
     # Add agent scratchpad debugging section
@@ -1117,8 +1421,10 @@ def render_ai_suggestions():
         with st.expander("🔧 Agent Debug Info (Developer Mode)"):
             st.subheader("Agent Scratchpad History")
             
-            for i, debug_info in enumerate(reversed(st.session_state.agent_scratchpad_debug[-5:])):  # Show last 5
-                st.write(f"**Debug Session {len(st.session_state.agent_scratchpad_debug) - i}** - {debug_info['timestamp']}")
+            debug_history = st.session_state.agent_scratchpad_debug
+            # Newest first, numbered from the oldest retained run
+            for session_number, debug_info in zip(range(len(debug_history), 0, -1), reversed(debug_history)):
+                st.write(f"**Debug Session {session_number}** - {debug_info['timestamp']}")
                 st.write(f"Type: {debug_info['type']}")
                 
                 # Show debug metadata
@@ -1127,21 +1433,50 @@ def render_ai_suggestions():
                 if debug_info.get('raw_response_keys'):
                     st.write(f"Response Keys: {debug_info['raw_response_keys']}")
                 
-                with st.expander(f"Input/Output {len(st.session_state.agent_scratchpad_debug) - i}"):
+                with st.expander(f"Input/Output {session_number}"):
                     st.write("**Input:**")
-                    st.code(debug_info['input'][:500] + "..." if len(debug_info['input']) > 500 else debug_info['input'])
+                    st.code(truncate_text(debug_info['input'], 500))
                     
                     st.write("**Output:**")
-                    st.code(debug_info['output'][:500] + "..." if len(debug_info['output']) > 500 else debug_info['output'])
+                    st.code(truncate_text(debug_info['output'], 500))
                     
                     if debug_info.get('intermediate_steps'):
                         st.write(f"**Intermediate Steps ({len(debug_info['intermediate_steps'])} steps):**")
                         for j, step in enumerate(debug_info['intermediate_steps']):
                             with st.expander(f"Step {j+1}"):
-                                st.markdown(format_agent_step(step))
+                                st.markdown(step)
                     else:
                         st.warning("⚠️ No intermediate steps captured. This might indicate the agent didn't use any tools or there's an issue with step capturing.")
 
+def remember_plan(inputs: Dict[str, Any], timeline: BudgetTimeline):
+    """Add a generated plan to the session's history, keeping the latest PLAN_HISTORY_SIZE"""
+    # Re-running the same inputs replaces the previous entry instead of listing it twice
+    history = [entry for entry in st.session_state.plan_history if entry["inputs"] != inputs] + [
+        {"inputs": inputs, "timeline": copy.deepcopy(timeline), "ts": datetime.now()}
+    ]
+    st.session_state.plan_history = history[-PLAN_HISTORY_SIZE:]
+
+def render_plan_history():
+    """List earlier plans; opening one restores its timeline without re-invoking the agent"""
+    history = st.session_state.plan_history
+    with st.expander(f"🕘 Previous plans ({len(history)})"):
+        for i, entry in enumerate(reversed(history)):
+            inputs = entry["inputs"]
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                st.markdown(
+                    f"**{entry['ts'].strftime('%H:%M:%S')}** · {inputs['currency']}{inputs['budget']:,.2f} "
+                    f"in {inputs['location']} · {len(entry['timeline'].items)} items"
+                )
+                st.caption(inputs['activities'][:120])
+            with col2:
+                if st.button("Open", key=f"open_plan_{len(history) - i}"):
+                    # Restore a copy so edits don't change the stored plan
+                    st.session_state.timeline = copy.deepcopy(entry["timeline"])
+                    st.session_state.selected_item_id = None
+                    st.session_state.edit_mode = False
+                    st.rerun()
+
 def render_timeline_export():
     """Render timeline export options"""
     if st.session_state.timeline and st.session_state.timeline.items:
@@ -1151,13 +1486,14 @@ def render_timeline_export():
         
         with col1:
             if st.button("📊 Export as CSV"):
-                # Create DataFrame from timeline items
-                items_data = [asdict(item) for item in st.session_state.timeline.items]
-                df = pd.DataFrame(items_data)
-                csv = df.to_csv(index=False)
+                # The columns are known, so rows are written directly rather than through a DataFrame
+                buffer = io.StringIO()
+                writer = csv.DictWriter(buffer, fieldnames=TIMELINE_ITEM_FIELDS, lineterminator="\n")
+                writer.writeheader()
+                writer.writerows(timeline_item_dict(item) for item in st.session_state.timeline.items)
                 st.download_button(
                     label="📥 Download CSV",
-                    data=csv,
+                    data=buffer.getvalue(),
                     file_name=f"budget_timeline_{datetime.now().strftime('%Y%m%d')}.csv",
                     mime="text/csv"
                 )
@@ -1165,7 +1501,7 @@ def render_timeline_export():
         with col2:
             if st.button("📋 Export as JSON"):
                 timeline_data = {
-                    'timeline': asdict(st.session_state.timeline),
+                    'timeline': timeline_dict(st.session_state.timeline),
                     'export_date': datetime.now().isoformat(),
                     'app_version': '2.0'
                 }
@@ -1181,8 +1517,147 @@ def render_timeline_export():
             if st.button("🎨 Generate PDF Report"):
                 st.info("PDF export feature coming soon! For now, use the browser's print function.")
 
+# Icons for recursive_budget_optimization suggestion severities
+SEVERITY_EMOJI = {"high": "🔥", "medium": "⚠️", "low": "💡"}
+
+def render_budget_node(node: BudgetNode, level: int = 0):
+    """Recursively renders budget tree nodes in the UI"""
+    # Base case: Maximum display depth
+    if level > 3:
+        return
+    
+    # Indent based on hierarchy level  
+    indent = "  " * level
+    emoji = "🌟" if level == 0 else "📁" if level == 1 else "📄"
+    
+    # Color-code based on utilization rate (a computed property, so read it once)
+    utilization = node.utilization_rate
+    if utilization > 120:
+        status_color = "🔴"
+    elif utilization > 100:
+        status_color = "🟡"
+    elif utilization < 50:
+        status_color = "🔵"  
+    else:
+        status_color = "🟢"
+    
+    # Display node information as one markdown element rather than one per line
+    st.markdown("\n\n".join((
+        f"{indent}{emoji} **{node.name}** {status_color}",
+        f"{indent}   💰 Budget: ${node.allocated_budget:.2f} | Spent: ${node.actual_cost:.2f}",
+        f"{indent}   📊 Utilization: {utilization:.1f}% | Items: {len(node.items)}",
+    )))
+    
+    # Recursive case: Render children
+    if node.children:
+        for child in node.children:
+            render_budget_node(child, level + 1)
+
+def render_optimization_results(results: Dict[str, Any], level: int = 0):
+    """Recursively renders optimization results"""
+    # Base case: Maximum display depth
+    if level > 3:
+        return
+    
+    indent = "  " * level
+    # The node and its suggestions are collected into one markdown element
+    lines = [
+        f"{indent}**{results['node_name']}** (Depth {results['depth']})",
+        f"{indent}💰 Budget: ${results['allocated_budget']:.2f} | Actual: ${results['current_cost']:.2f}",
+        f"{indent}📊 Utilization: {results['utilization_rate']:.1f}%",
+    ]
+    
+    # Display suggestions for this node
+    if results.get('suggestions'):
+        lines.append(f"{indent}💡 **Suggestions:**")
+        for suggestion in results['suggestions']:
+            emoji = SEVERITY_EMOJI.get(suggestion['severity'], "💡")
+            lines.append(f"{indent}  {emoji} {suggestion['message']}")
+    st.markdown("\n\n".join(lines))
+    
+    # Recursive case: Render children results
+    if results.get('children_analyses'):
+        for child_result in results['children_analyses']:
+            render_optimization_results(child_result, level + 1)
+
+@st.fragment
+def render_recursive_search():
+    """Renders the recursive search panel as a fragment, so its inputs rerun only this panel
+    rather than redrawing the timeline, chart and budget tree above it"""
+    st.markdown("**Demonstrate recursive search with nested criteria:**")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.subheader("Search Criteria")
+        search_category = st.selectbox("Category contains:", 
+                                     options=SEARCH_CATEGORY_OPTIONS,
+                                     key="search_category")
+        
+        search_location = st.text_input("Location contains:", key="search_location")
+        
+        cost_min = st.number_input("Min cost:", min_value=0.0, value=0.0, key="cost_min")
+        cost_max = st.number_input("Max cost:", min_value=0.0, value=1000.0, key="cost_max")
+    
+    with col2:
+        st.subheader("Advanced Criteria")
+        use_nested = st.checkbox("Use nested AND/OR logic", key="use_nested")
+        
+        if use_nested:
+            nested_category = st.selectbox("Nested category:", 
+                                         options=NESTED_CATEGORY_OPTIONS,
+                                         key="nested_category")
+            logic_operator = st.radio("Logic operator:", ["AND", "OR"], key="logic_op")
+    
+    if st.button("🔍 Recursive Search", key="recursive_search_btn"):
+        # Build search criteria
+        criteria = {}
+        
+        if search_category:
+            criteria["category"] = search_category
+        if search_location:
+            criteria["location"] = search_location
+        if cost_min < cost_max:
+            criteria["cost_range"] = (cost_min, cost_max)
+        
+        # Add nested criteria if specified
+        if use_nested and nested_category:
+            nested_logic = logic_operator.lower()
+            criteria[nested_logic] = {"category": nested_category}
+        
+        if criteria:
+            with st.spinner("Performing recursive search..."):
+                results = recursive_timeline_search(st.session_state.timeline.items, criteria)
+            
+            st.subheader(f"🎯 Search Results ({len(results)} items found)")
+            
+            if results:
+                for item in results:
+                    with st.container():
+                        col1, col2, col3 = st.columns([2, 1, 1])
+                        with col1:
+                            st.markdown(f"**{item.title}**")
+                            st.caption(f"{item.description}")
+                        with col2:
+                            st.text(f"📅 {item.date}")
+                            st.text(f"📍 {item.location}")
+                        with col3:
+                            st.metric("Cost", f"${item.cost:.2f}")
+                            st.text(f"🏷️ {item.category}")
+                        st.markdown("---")
+            else:
+                st.info("No items match the specified criteria. Try adjusting your search parameters.")
+        else:
+            st.warning("Please specify at least one search criterion.")
+
 # --- User Input Area ---
 st.header("Step 1: Your Budget Details", divider="rainbow")
+# Budget and currency sit outside the form so changing them retargets the current timeline
+# (totals, remaining budget, budget tree) straight away. The plan request inputs live in a
+# form so editing them doesn't rerun the whole app on every keystroke. Without an agent
+# there is nothing to submit, so the form and activities box are skipped.
+planner_ready = budget_agent_executor is not None
+submitted = False
 col1, col2 = st.columns([1, 2])
 
 with col1:
@@ -1193,99 +1668,106 @@ with col1:
         value=200.0,
         help="Specify your total available budget for the listed activities."
     )
-    
+
     # Update existing timeline budget if it exists and budget changed
     if st.session_state.timeline and st.session_state.timeline.total_budget != bi:
         st.session_state.timeline.total_budget = bi
-    
+
+with col2:
     cs = st.selectbox(
         "💵 Select your currency:",
         options=cur_symbols,
         index=0,
         help="Choose the currency in which your budget is denominated."
     )
-    
+
     # Update existing timeline currency if it exists and currency changed
     if st.session_state.timeline and st.session_state.timeline.currency != cs:
         st.session_state.timeline.currency = cs
-    
-    li = st.text_input(
-        "📍 Enter your location (optional):",
-        placeholder="e.g., New York, USA",
-        help="Specify your location to tailor the budget plan to local costs."
-    )
 
-with col2:
-    e_a = "Round-trip flight from LAX to JFK on 2025-08-15 returning 2025-08-20, 3 restaurant meals in New York, visit Central Park attractions, 2 Broadway show tickets"
-    act_i = st.text_area(
-        "📝 List desired activities:",
-        height=120,
-        placeholder=f"e.g., {e_a}",
-        help="List all activities you want to budget for. For flights, include departure/destination airports and dates. Be as specific as possible."
-    )
+with st.form("budget_form", clear_on_submit=False, border=False) if planner_ready else st.container():
+    col1, col2 = st.columns([1, 2])
 
-# --- Generate Plan Button ---
-st.header("Step 2: Generate Your Timeline", divider="rainbow")
+    with col1:
+        li = st.text_input(
+            "📍 Enter your location (optional):",
+            placeholder="e.g., New York, USA",
+            help="Specify your location to tailor the budget plan to local costs."
+        )
 
-col1, col2, col3 = st.columns(3)
-with col1:
-    if st.button("✨ Generate AI Timeline", type="primary", use_container_width=True):
-        if not GOOGLE_API_KEY or not budget_agent_executor:
-            st.error("AI Model not initialized. Please ensure your Google API Key is correctly entered.")
-            st.toast("API Key or AI Model issue.", icon="🔑")
-        elif bi <= 0:
-            st.warning("Please enter a budget amount greater than zero.")
-            st.toast("Budget must be positive.", icon="⚠️")
-        elif not act_i.strip():
-            st.warning("Please list some activities you'd like to plan for.")
-            st.toast("Activities list is empty.", icon="⚠️")
+    with col2:
+        if planner_ready:
+            act_i = st.text_area(
+                "📝 List desired activities:",
+                height=120,
+                placeholder=f"e.g., {EXAMPLE_ACTIVITIES}",
+                help="List all activities you want to budget for. For flights, include departure/destination airports and dates. Be as specific as possible."
+            )
         else:
-            with st.spinner("🤖 AI is creating your interactive timeline... Please wait."):
-                try:
-                    inputs = {
-                        "budget": bi, 
-                        "activities": act_i, 
-                        "location": li or NOT_SPECIFIED, 
-                        "currency": cs
-                    }
-                    
-                    ai_response = budget_agent_executor.invoke(inputs)
-                    output = ai_response.get("output", str(ai_response))
-                    
-                    # Store the raw agent response for debugging
-                    if 'agent_scratchpad_debug' not in st.session_state:
-                        st.session_state.agent_scratchpad_debug = []
-                    
-                    # Enhanced debugging information
-                    debug_entry = {
-                        'timestamp': datetime.now().isoformat(),
-                        'type': 'timeline_generation',
-                        'input': f"Budget: {cs}{bi}, Activities: {act_i}, Location: {li}",
-                        'output': output,
-                        'intermediate_steps': ai_response.get('intermediate_steps', []),
-                        'raw_response_keys': list(ai_response.keys()) if isinstance(ai_response, dict) else 'not_dict',
-                        'has_intermediate_steps': 'intermediate_steps' in ai_response,
-                        'num_intermediate_steps': len(ai_response.get('intermediate_steps', []))
-                    }
-                    
-                    st.session_state.agent_scratchpad_debug.append(debug_entry)
-                    
-                    # Debug output in console if debug mode is on
-                    if st.session_state.get('show_debug', False):
-                        st.write(f"🐛 **Debug Info:** Found {debug_entry['num_intermediate_steps']} intermediate steps")
-                    
-                    # Parse the AI response into a timeline
-                    timeline = parse_ai_response_to_timeline(output, bi, cs, li or NOT_SPECIFIED)
-                    st.session_state.timeline = timeline
-                    
-                    st.success("🎉 Timeline generated successfully!")
-                    st.toast("Timeline created!", icon="✅")
-                    st.rerun()
+            st.info("Add your Google API Key in the sidebar to enable the AI planner. You can still add timeline items manually.")
+
+    # --- Generate Plan Button ---
+    st.header("Step 2: Generate Your Timeline", divider="rainbow")
+    if planner_ready:
+        regenerate = st.checkbox(
+            "🔄 Regenerate (ignore cached plan)",
+            help="Identical requests reuse the plan generated within the last hour. Tick this to ask the AI again."
+        )
+        submitted = st.form_submit_button("✨ Generate AI Timeline", type="primary", use_container_width=True)
+
+if submitted:
+    if bi <= 0:
+        st.warning("Please enter a budget amount greater than zero.")
+        st.toast("Budget must be positive.", icon="⚠️")
+    elif not act_i.strip():
+        st.warning("Please list some activities you'd like to plan for.")
+        st.toast("Activities list is empty.", icon="⚠️")
+    else:
+        # Clean the free-text inputs once; everything below uses the cleaned values
+        activities = act_i.strip()
+        location = li.strip() or NOT_SPECIFIED
+        inputs = {
+            "budget": bi, 
+            "activities": activities, 
+            "location": location, 
+            "currency": cs
+        }
+        # Show each tool call as it completes instead of a silent spinner for the whole run
+        with st.status("🤖 AI is creating your interactive timeline... Please wait.") as status:
+            try:
+                # Only bind the tools these activities need; each subset's agent is cached
+                plan_executor = get_budget_agent(GOOGLE_API_KEY, GOOGLE_MAPS_API_KEY or None, select_tools(activities))
+                plan_key = plan_cache_key(plan_executor, bi, cs, location, activities)
+                logger.debug("Invoking agent: budget=%s%s, location=%s, activities=%.50s, tools=%s",
+                             cs, bi, location, activities, [tool.name for tool in plan_executor.tools])
+                ai_response = run_budget_agent(
+                    plan_key, plan_executor, inputs,
+                    on_step=lambda step: status.markdown(format_agent_step(step)),
+                    refresh=regenerate
+                )
+                output = ai_response.get("output", str(ai_response))
+                record_agent_debug(
+                    'timeline_generation',
+                    f"Budget: {cs}{bi}, Activities: {activities}, Location: {location}",
+                    ai_response
+                )
+                
+                # Parse the AI response into a timeline
+                timeline = parse_ai_response_to_timeline(output, bi, cs, location)
+                st.session_state.timeline = timeline
+                remember_plan(inputs, timeline)
+                
+                status.update(label="Timeline ready", state="complete")
+                st.success("🎉 Timeline generated successfully!")
+                st.toast("Timeline created!", icon="✅")
+                st.rerun()
 
-                except Exception as e:
-                    st.error(f"An error occurred while generating the timeline: {e}")
-                    st.toast(f"Generation error: {e}", icon="❌")
+            except Exception as e:
+                status.update(label="Timeline generation failed", state="error")
+                st.error(f"An error occurred while generating the timeline: {e}")
+                st.toast(f"Generation error: {e}", icon="❌")
 
+col2, col3 = st.columns(2)
 with col2:
     if st.button("➕ Add Manual Item", use_container_width=True):
         if not st.session_state.timeline:
@@ -1308,78 +1790,35 @@ with col3:
             with st.spinner("Getting AI suggestions..."):
                 try:
                     # Calculate current statistics
-                    total_cost = sum(item.cost for item in st.session_state.timeline.items)
-                    remaining_budget = st.session_state.timeline.total_budget - total_cost
-                    
-                    suggestion_prompt = f"""
-                    Analyze the current budget timeline and provide specific optimization suggestions in JSON format.
+                    total_cost = st.session_state.timeline.total_cost
+                    remaining_budget = st.session_state.timeline.remaining_budget
+                    items_listing = "\n".join(
+                        f"- {item.title}: {cs}{item.cost:.2f} on {item.date} ({item.category})"
+                        for item in st.session_state.timeline.items
+                    )
                     
-                    Current Timeline:
-                    - Total items: {len(st.session_state.timeline.items)}
-                    - Total budget: {cs}{bi}
-                    - Current cost: {cs}{total_cost:.2f}
-                    - Remaining budget: {cs}{remaining_budget:.2f}
-                    - Location: {st.session_state.timeline.location}
+                    timeline_summary = f"""Total budget: {cs}{bi}
+Current cost: {cs}{total_cost:.2f}
+Remaining budget: {cs}{remaining_budget:.2f}
+Location: {st.session_state.timeline.location}
+Items ({len(st.session_state.timeline.items)}):
+{items_listing}"""
                     
-                    Items:
-                    {chr(10).join([f"- {item.title}: {cs}{item.cost:.2f} on {item.date} ({item.category})" for item in st.session_state.timeline.items])}
-                    
-                    Return JSON with this structure:
-                    {{
-                        "suggestions": [
-                            {{
-                                "type": "cost_optimization|budget_reallocation|activity_suggestion|time_optimization",
-                                "suggestion": "Specific actionable suggestion",
-                                "potential_savings": 25.50,
-                                "affected_items": ["item_title1", "item_title2"],
-                                "priority": "high|medium|low"
-                            }}
-                        ],
-                        "budget_analysis": {{
-                            "status": "over_budget|within_budget|under_budget",
-                            "recommendations": ["recommendation1", "recommendation2"]
-                        }}
-                    }}
-                    """
-                    
-                    inputs = {
-                        "budget": bi,
-                        "activities": suggestion_prompt,
-                        "location": st.session_state.timeline.location,
-                        "currency": cs
-                    }
-                    
-                    suggestion_response = budget_agent_executor.invoke(inputs)
-                    output = suggestion_response.get("output", str(suggestion_response))
-                    
-                    # Store the raw agent response for debugging
-                    if 'agent_scratchpad_debug' not in st.session_state:
-                        st.session_state.agent_scratchpad_debug = []
-                    
-                    # Enhanced debugging information
-                    debug_entry = {
-                        'timestamp': datetime.now().isoformat(),
-                        'type': 'ai_suggestions',
-                        'input': suggestion_prompt,
-                        'output': output,
-                        'intermediate_steps': suggestion_response.get('intermediate_steps', []),
-                        'raw_response_keys': list(suggestion_response.keys()) if isinstance(suggestion_response, dict) else 'not_dict',
-                        'has_intermediate_steps': 'intermediate_steps' in suggestion_response,
-                        'num_intermediate_steps': len(suggestion_response.get('intermediate_steps', []))
-                    }
-                    
-                    st.session_state.agent_scratchpad_debug.append(debug_entry)
-                    
-                    # Debug output in console if debug mode is on
-                    if st.session_state.get('show_debug', False):
-                        st.write(f"🐛 **Debug Info:** Found {debug_entry['num_intermediate_steps']} intermediate steps")
+                    # Identical timelines are answered from the LLM cache; without tools there are no
+                    # tool-call ids to make repeated prompts differ
+                    suggestion_message = get_suggestion_chain(GOOGLE_API_KEY).invoke({"timeline": timeline_summary})
+                    output = suggestion_message.text()
+                    record_agent_debug('ai_suggestions', timeline_summary, {"output": output})
                     
                     # Parse AI suggestions
                     try:
-                        import re
-                        json_match = re.search(r'\{.*\}', output, re.DOTALL)
-                        if json_match:
-                            suggestions_data = json.loads(json_match.group())
+                        try:
+                            # Fast path: the reply is the bare JSON object the prompt asks for
+                            suggestions_data = json.loads(output)
+                        except json.JSONDecodeError:
+                            json_match = JSON_BLOCK_PATTERN.search(output)
+                            suggestions_data = json.loads(json_match.group()) if json_match else None
+                        if isinstance(suggestions_data, dict):
                             st.session_state.ai_suggestions = suggestions_data.get('suggestions', [])
                             st.session_state.budget_analysis = suggestions_data.get('budget_analysis', {})
                         else:
@@ -1387,7 +1826,7 @@ with col3:
                             st.session_state.ai_suggestions = [
                                 {
                                     "type": "general_optimization",
-                                    "suggestion": output[:200] + "..." if len(output) > 200 else output,
+                                    "suggestion": truncate_text(output, 200),
                                     "potential_savings": 0.0,
                                     "priority": "medium"
                                 }
@@ -1417,12 +1856,15 @@ st.header("Step 3: Your Interactive Timeline", divider="rainbow")
 if st.session_state.edit_mode:
     selected_item = None
     if st.session_state.selected_item_id and st.session_state.timeline:
-        selected_item = next((item for item in st.session_state.timeline.items if item.id == st.session_state.selected_item_id), None)
+        selected_item = st.session_state.timeline.get_item(st.session_state.selected_item_id)
     
     render_item_editor(selected_item)
     
     st.markdown("---")
 
+if st.session_state.plan_history:
+    render_plan_history()
+
 # Show timeline if exists
 if st.session_state.timeline:
     render_timeline_editor()
@@ -1474,11 +1916,17 @@ if st.session_state.timeline and st.session_state.timeline.items:
         col1, col2 = st.columns(2)
         
         with col1:
+            # The tree and optimization results are displayed below these buttons, so this
+            # run already shows them and neither button needs to rerun the script
             if st.button("🌲 Generate Budget Tree", key="generate_tree_btn"):
                 with st.spinner("Building hierarchical budget tree..."):
-                    st.session_state.budget_tree = create_hierarchical_budget_tree(st.session_state.timeline)
-                st.success("Budget tree generated!")
-                st.rerun()
+                    tree, tree_stats = build_budget_tree(st.session_state.timeline)
+                # build_budget_tree is cached on the timeline, so an unchanged timeline returns the same tree
+                if tree is st.session_state.budget_tree:
+                    st.toast("Budget tree is already up to date")
+                else:
+                    st.session_state.budget_tree, st.session_state.budget_tree_stats = tree, tree_stats
+                    st.success("Budget tree generated!")
         
         with col2:
             if st.button("⚡ Optimize Budget Recursively", key="optimize_budget_btn"):
@@ -1490,7 +1938,6 @@ if st.session_state.timeline and st.session_state.timeline.items:
                             optimization_factor
                         )
                     st.success("Optimization complete!")
-                    st.rerun()
                 else:
                     st.warning("Generate budget tree first!")
         
@@ -1498,68 +1945,10 @@ if st.session_state.timeline and st.session_state.timeline.items:
         if st.session_state.budget_tree:
             st.subheader("🌳 Hierarchical Budget Breakdown")
             
-            def render_budget_node(node: BudgetNode, level: int = 0):
-                """Recursively renders budget tree nodes in the UI"""
-                # Base case: Maximum display depth
-                if level > 3:
-                    return
-                
-                # Indent based on hierarchy level  
-                indent = "  " * level
-                emoji = "🌟" if level == 0 else "📁" if level == 1 else "📄"
-                
-                # Color-code based on utilization rate
-                if node.utilization_rate > 120:
-                    status_color = "🔴"
-                elif node.utilization_rate > 100:
-                    status_color = "🟡"
-                elif node.utilization_rate < 50:
-                    status_color = "🔵"  
-                else:
-                    status_color = "🟢"
-                
-                # Display node information
-                st.markdown(f"{indent}{emoji} **{node.name}** {status_color}")
-                st.markdown(f"{indent}   💰 Budget: ${node.allocated_budget:.2f} | Spent: ${node.actual_cost:.2f}")
-                st.markdown(f"{indent}   📊 Utilization: {node.utilization_rate:.1f}% | Items: {len(node.items)}")
-                
-                # Recursive case: Render children
-                if node.children:
-                    for child in node.children:
-                        render_budget_node(child, level + 1)
-            
             render_budget_node(st.session_state.budget_tree)
             
-            # Display tree statistics
-            def calculate_tree_stats(node: BudgetNode) -> Dict[str, int]:
-                """Recursively calculates statistics for the budget tree"""
-                # Base case: Leaf node
-                if not node.children:
-                    return {
-                        "total_nodes": 1,
-                        "leaf_nodes": 1, 
-                        "max_depth": 0,
-                        "over_budget_nodes": 1 if node.utilization_rate > 100 else 0
-                    }
-                
-                # Recursive case: Aggregate children statistics
-                stats = {
-                    "total_nodes": 1,
-                    "leaf_nodes": 0,
-                    "max_depth": 0,
-                    "over_budget_nodes": 1 if node.utilization_rate > 100 else 0
-                }
-                
-                for child in node.children:
-                    child_stats = calculate_tree_stats(child)
-                    stats["total_nodes"] += child_stats["total_nodes"]
-                    stats["leaf_nodes"] += child_stats["leaf_nodes"]
-                    stats["max_depth"] = max(stats["max_depth"], child_stats["max_depth"] + 1)
-                    stats["over_budget_nodes"] += child_stats["over_budget_nodes"]
-                
-                return stats
-            
-            tree_stats = calculate_tree_stats(st.session_state.budget_tree)
+            # Display tree statistics, computed once when the tree was built
+            tree_stats = st.session_state.budget_tree_stats
             
             st.markdown("#### 📈 Tree Statistics")
             col1, col2, col3, col4 = st.columns(4)
@@ -1572,30 +1961,6 @@ if st.session_state.timeline and st.session_state.timeline.items:
         if st.session_state.optimization_results:
             st.subheader("⚡ Recursive Optimization Results")
             
-            def render_optimization_results(results: Dict[str, Any], level: int = 0):
-                """Recursively renders optimization results"""
-                # Base case: Maximum display depth
-                if level > 3:
-                    return
-                
-                indent = "  " * level
-                st.markdown(f"{indent}**{results['node_name']}** (Depth {results['depth']})")
-                st.markdown(f"{indent}💰 Budget: ${results['allocated_budget']:.2f} | Actual: ${results['current_cost']:.2f}")
-                st.markdown(f"{indent}📊 Utilization: {results['utilization_rate']:.1f}%")
-                
-                # Display suggestions for this node
-                if results.get('suggestions'):
-                    st.markdown(f"{indent}💡 **Suggestions:**")
-                    for suggestion in results['suggestions']:
-                        severity_emoji = {"high": "🔥", "medium": "⚠️", "low": "💡"}
-                        emoji = severity_emoji.get(suggestion['severity'], "💡")
-                        st.markdown(f"{indent}  {emoji} {suggestion['message']}")
-                
-                # Recursive case: Render children results
-                if results.get('children_analyses'):
-                    for child_result in results['children_analyses']:
-                        render_optimization_results(child_result, level + 1)
-            
             render_optimization_results(st.session_state.optimization_results)
             
             # Summary statistics
@@ -1607,71 +1972,7 @@ if st.session_state.timeline and st.session_state.timeline.items:
     
     # Recursive Timeline Search Demo
     with st.expander("🔍 Recursive Timeline Search", expanded=False):
-        st.markdown("**Demonstrate recursive search with nested criteria:**")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.subheader("Search Criteria")
-            search_category = st.selectbox("Category contains:", 
-                                         options=["", "Food", "Transport", "Entertainment", "Activities"],
-                                         key="search_category")
-            
-            search_location = st.text_input("Location contains:", key="search_location")
-            
-            cost_min = st.number_input("Min cost:", min_value=0.0, value=0.0, key="cost_min")
-            cost_max = st.number_input("Max cost:", min_value=0.0, value=1000.0, key="cost_max")
-        
-        with col2:
-            st.subheader("Advanced Criteria")
-            use_nested = st.checkbox("Use nested AND/OR logic", key="use_nested")
-            
-            if use_nested:
-                nested_category = st.selectbox("Nested category:", 
-                                             options=["", "Accommodation", "Shopping", "Culture"],
-                                             key="nested_category")
-                logic_operator = st.radio("Logic operator:", ["AND", "OR"], key="logic_op")
-        
-        if st.button("🔍 Recursive Search", key="recursive_search_btn"):
-            # Build search criteria
-            criteria = {}
-            
-            if search_category:
-                criteria["category"] = search_category
-            if search_location:
-                criteria["location"] = search_location
-            if cost_min < cost_max:
-                criteria["cost_range"] = (cost_min, cost_max)
-            
-            # Add nested criteria if specified
-            if use_nested and nested_category:
-                nested_logic = logic_operator.lower()
-                criteria[nested_logic] = {"category": nested_category}
-            
-            if criteria:
-                with st.spinner("Performing recursive search..."):
-                    results = recursive_timeline_search(st.session_state.timeline.items, criteria)
-                
-                st.subheader(f"🎯 Search Results ({len(results)} items found)")
-                
-                if results:
-                    for item in results:
-                        with st.container():
-                            col1, col2, col3 = st.columns([2, 1, 1])
-                            with col1:
-                                st.markdown(f"**{item.title}**")
-                                st.caption(f"{item.description}")
-                            with col2:
-                                st.text(f"📅 {item.date}")
-                                st.text(f"📍 {item.location}")
-                            with col3:
-                                st.metric("Cost", f"${item.cost:.2f}")
-                                st.text(f"🏷️ {item.category}")
-                            st.markdown("---")
-                else:
-                    st.info("No items match the specified criteria. Try adjusting your search parameters.")
-            else:
-                st.warning("Please specify at least one search criterion.")
+        render_recursive_search()
     
     # Educational section on recursion
     with st.expander("📚 Understanding Recursion in Budget Planning", expanded=False):
@@ -1681,14 +1982,13 @@ if st.session_state.timeline and st.session_state.timeline.items:
         **1. Hierarchical Budget Tree Creation**
         ```python
         def create_hierarchical_budget_tree(timeline, rules):
-            # Base case: No items to process
-            if not timeline.items:
-                return empty_node
+            # One pass groups items by category, location and date
+            for item in timeline.items:
+                categories[item.category][item.location][item.date].append(item)
             
-            # Recursive case: Create subcategories
-            for category in categories:
-                child_node = create_budget_subcategories(items, budget)
-                # Recursion happens in create_budget_subcategories()
+            # Costs roll up bottom-up: dates → locations → categories
+            for category, locations in categories.items():
+                category_node.children = location_nodes(locations)
         ```
         
         **2. Recursive Optimization Analysis**
@@ -1752,17 +2052,18 @@ with st.expander("🔍 Click to explore Set Operations in Budget Planning", expa
     # Display the sets
     col1, col2, col3 = st.columns(3)
     
+    # Shown as plain sets; st.write would print the frozensets' repr as "frozenset({...})"
     with col1:
         st.subheader("🌟 Set A: Popular Destinations")
-        st.write(set_a)
+        st.write(set(set_a))
     
     with col2:
         st.subheader("💰 Set B: Budget-Friendly")
-        st.write(set_b)
+        st.write(set(set_b))
     
     with col3:
         st.subheader("🏔️ Set C: Adventure Destinations")
-        st.write(set_c)
+        st.write(set(set_c))
     
     # Button to perform operations
     if st.button("🔄 Perform All Set Operations", key="set_operations_btn"):
@@ -1832,17 +2133,17 @@ with st.expander("🔍 Click to explore Set Operations in Budget Planning", expa
         st.markdown("#### 📈 Summary Statistics")
         col1, col2, col3, col4 = st.columns(4)
         
-        # Define metrics using dictionary comprehension
-        metrics = {
-            "Total Unique Destinations": len(results['union']),
-            "Common to All Sets": len(results['intersection']),
-            "Only Popular or Budget": len(results['symmetric_diff_a_b']),
-            "Exclusive Adventure": len(results['difference_c_a'])
-        }
+        # (label, value) pairs in column order; they are only iterated, so a tuple suffices
+        metrics = (
+            ("Total Unique Destinations", len(results['union'])),
+            ("Common to All Sets", len(results['intersection'])),
+            ("Only Popular or Budget", len(results['symmetric_diff_a_b'])),
+            ("Exclusive Adventure", len(results['difference_c_a']))
+        )
         
-        # Display metrics using list comprehension with column assignment
-        columns = [col1, col2, col3, col4]
-        [col.metric(label, value) for col, (label, value) in zip(columns, metrics.items())]
+        # Display one metric per column
+        for col, (label, value) in zip((col1, col2, col3, col4), metrics):
+            col.metric(label, value)
     
     # Educational section
     st.markdown("### 📚 Educational Notes")
@@ -1893,34 +2194,35 @@ with st.expander("🔍 Click to explore Set Operations in Budget Planning", expa
             custom_c = {item.strip() for item in custom_set_c.split('\n') if item.strip()}
             
             if custom_a and custom_b and custom_c:
-                custom_results = perform_set_operations(custom_a, custom_b, custom_c)
+                custom_results = perform_set_operations(frozenset(custom_a), frozenset(custom_b), frozenset(custom_c))
                 
                 st.markdown("#### 🎯 Your Custom Sets Analysis")
                 
                 # Using dictionary comprehension for result formatting
                 result_labels = {
-                    'union': "Union (All items):",
-                    'intersection': "Intersection (Common items):",
-                    'difference_a_b': "Set A - Set B:",
-                    'difference_c_a': "Set C - Set A:",
-                    'symmetric_diff_a_b': "Symmetric Difference (A ⊕ B):"
+                    'union': "Union (All items)",
+                    'intersection': "Intersection (Common items)",
+                    'difference_a_b': "Set A - Set B",
+                    'difference_c_a': "Set C - Set A",
+                    'symmetric_diff_a_b': "Symmetric Difference (A ⊕ B)"
                 }
                 
-                # Display set operation results using comprehension
-                for key, label in result_labels.items():
-                    result = custom_results[key]
-                    display_value = sorted(result) if result else "None"
-                    st.write(f"**{label}**", display_value)
-                
                 # Boolean results using dictionary comprehension
                 boolean_results = {
                     'is_subset_b_a': "Is B ⊆ A?",
                     'is_superset_a_c': "Is A ⊇ C?"
                 }
                 
-                for key, question in boolean_results.items():
-                    answer = "✅ Yes" if custom_results[key] else "❌ No"
-                    st.write(f"**{question}**", answer)
+                # All results go into one table, built with list comprehensions
+                rows = [
+                    {"Operation": label, "Result": ", ".join(sorted(custom_results[key])) or "None"}
+                    for key, label in result_labels.items()
+                ]
+                rows += [
+                    {"Operation": question, "Result": "✅ Yes" if custom_results[key] else "❌ No"}
+                    for key, question in boolean_results.items()
+                ]
+                st.table(rows)
             else:
                 st.warning("Please ensure all three sets have at least one item each.")
         except Exception as e:
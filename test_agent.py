@@ -4,13 +4,25 @@ Test script for the LangChain agent with Google Maps tool.
 This script will help verify that the agent can properly execute the Google Maps search tool.
 """
 
+import asyncio
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.agents import create_tool_calling_agent, AgentExecutor
-from langchain_core.prompts import ChatPromptTemplate
-from Tools.google_map_search import GoogleMapSearchTool
+from functools import lru_cache
 
-def test_agent():
+@lru_cache(maxsize=1)
+def make_llm_and_tool(google_api_key: str, google_maps_api_key: str):
+    """Create the Gemini client and Maps tool once, so both tests share them."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from Tools.google_map_search import GoogleMapSearchTool
+    
+    llm = ChatGoogleGenerativeAI(
+        model="gemini-1.5-flash-latest",
+        google_api_key=google_api_key,
+        temperature=0.7,
+    )
+    map_tool = GoogleMapSearchTool(api_key=google_maps_api_key)
+    return llm, map_tool
+
+async def test_agent():
     """Test the LangChain agent with Google Maps tool."""
     
     # Check environment variables
@@ -25,16 +37,13 @@ def test_agent():
         print("❌ GOOGLE_MAPS_API_KEY environment variable not found") 
         return False
     
+    # Imported here so a missing key is reported before loading the LangChain/Gemini stack
+    from langchain.agents import create_tool_calling_agent, AgentExecutor
+    from langchain_core.prompts import ChatPromptTemplate
+    
     try:
-        print("🔧 Initializing LLM...")
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash-latest",
-            google_api_key=google_api_key,
-            temperature=0.7,
-        )
-        
-        print("🔧 Initializing Google Maps tool...")
-        map_tool = GoogleMapSearchTool(api_key=google_maps_api_key)
+        print("🔧 Initializing LLM and Google Maps tool...")
+        llm, map_tool = make_llm_and_tool(google_api_key, google_maps_api_key)
         tools = [map_tool]
         
         print("🔧 Creating agent prompt...")
@@ -63,7 +72,7 @@ def test_agent():
             "input": "Find 3 coffee shops in Bangkok, Thailand"
         }
         
-        result = agent_executor.invoke(test_input)
+        result = await agent_executor.ainvoke(test_input)
         
         print("\n✅ Agent test successful!")
         print("📄 Result:")
@@ -77,7 +86,7 @@ def test_agent():
         traceback.print_exc()
         return False
 
-def test_budget_agent():
+async def test_budget_agent():
     """Test the budget planning agent."""
     
     google_api_key = os.getenv("GOOGLE_API_KEY")
@@ -87,16 +96,14 @@ def test_budget_agent():
         print("❌ API keys not found")
         return False
     
+    # Deferred for the same reason as in test_agent
+    from langchain.agents import create_tool_calling_agent, AgentExecutor
+    from langchain_core.prompts import ChatPromptTemplate
+    
     try:
         print("🔧 Testing budget agent...")
         
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash-latest",
-            google_api_key=google_api_key,
-            temperature=0.7,
-        )
-
-        map_tool = GoogleMapSearchTool(api_key=google_maps_api_key)
+        llm, map_tool = make_llm_and_tool(google_api_key, google_maps_api_key)
         tools = [map_tool]
         
         agent_prompt = ChatPromptTemplate.from_messages([
@@ -127,7 +134,7 @@ def test_budget_agent():
             "currency": "USD"
         }
         
-        result = agent_executor.invoke(test_inputs)
+        result = await agent_executor.ainvoke(test_inputs)
         
         print("\n✅ Budget agent test successful!")
         print("📄 Result:")
@@ -141,13 +148,64 @@ def test_budget_agent():
         traceback.print_exc()
         return False
 
+def test_repeated_budget_plans():
+    """Run two different plans back to back on the app's cached budget agent.
+
+    The cached executor's Gemini client is bound to the event loop of its first async run, so
+    the second plan only works if run_budget_agent keeps using that same loop.
+    """
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    google_maps_api_key = os.getenv("GOOGLE_MAPS_API_KEY")
+    
+    if not google_api_key or not google_maps_api_key:
+        print("❌ API keys not found")
+        return False
+    
+    # Deferred for the same reason as in test_agent; importing main also loads the app module
+    from main import get_budget_agent, plan_cache_key, run_budget_agent, select_tools
+    
+    try:
+        plans = [
+            {"budget": 200, "activities": "coffee shops", "location": "Bangkok", "currency": "USD"},
+            {"budget": 300, "activities": "ramen, museums", "location": "Tokyo", "currency": "USD"},
+        ]
+        activities = ", ".join(plan["activities"] for plan in plans)
+        # Same tool subset for both plans, so both runs use the same cached executor
+        executor = get_budget_agent(google_api_key, google_maps_api_key, select_tools(activities))
+        for number, inputs in enumerate(plans, 1):
+            print(f"🔧 Running plan {number} ({inputs['location']}) on the cached agent...")
+            plan_key = plan_cache_key(executor, inputs["budget"], inputs["currency"],
+                                      inputs["location"], inputs["activities"])
+            response = run_budget_agent(plan_key, executor, inputs, refresh=True)
+            if not response["output"]:
+                print(f"❌ Plan {number} returned no output")
+                return False
+        
+        print("\n✅ Both plans ran on the cached agent!")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Repeated plan test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+async def run_tests():
+    """Run both agent tests concurrently; each spends most of its time waiting on Gemini."""
+    return await asyncio.gather(test_agent(), test_budget_agent())
+
 if __name__ == "__main__":
     print("🧪 Testing LangChain Agent with Google Maps Tool")
     print("=" * 50)
     
-    print("\n1. Testing basic agent functionality...")
-    test_agent()
+    print("\nRunning the basic agent and budget planning agent tests concurrently...")
+    basic_ok, budget_ok = asyncio.run(run_tests())
+    
+    print("\n" + "=" * 50)
+    print(f"1. Basic agent functionality: {'✅' if basic_ok else '❌'}")
+    print(f"2. Budget planning agent: {'✅' if budget_ok else '❌'}")
     
     print("\n" + "=" * 50)
-    print("2. Testing budget planning agent...")
-    test_budget_agent()
+    print("3. Testing two plans back to back on the cached agent...")
+    repeated_ok = test_repeated_budget_plans()
+    print(f"3. Repeated budget plans: {'✅' if repeated_ok else '❌'}")
@@ -10,9 +10,8 @@ class PDFGenerator:
         pdf.set_title(self.title)
         pdf.set_font("Arial", size=12)
         
-        # Split content into lines and add each line to the PDF
-        for line in content.split('\n'):
-            pdf.cell(0, 10, txt=line, ln=1)
+        # multi_cell lays out every line (and wraps long ones) in a single call
+        pdf.multi_cell(0, 10, txt=content.replace('\r\n', '\n'))
         
         pdf.output(output_path)
 